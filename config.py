@@ -3,8 +3,21 @@ Configuration settings for the Face-Based Photo Search & Management System
 """
 
 import os
+import json
+from pathlib import Path
 from typing import Dict, Any
 
+# Faster JSON parsing when one of the optional libraries is installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        _json_loads = ujson.loads
+    except ImportError:
+        _json_loads = json.loads
+
 class Config:
     """
     Configuration class for application settings.
@@ -14,11 +27,12 @@ class Config:
     DATABASE_PATH = "face_database.db"
     
     # Face recognition settings
-    FACE_RECOGNITION_MODEL = "hog"  # Options: "hog", "cnn"
+    FACE_RECOGNITION_MODEL = "auto"  # Options: "auto" (cnn with CUDA, else hog), "hog", "cnn"
     FACE_SIMILARITY_TOLERANCE = 0.6  # Lower = more strict matching
     FACE_DETECTION_SCALE_FACTOR = 1.1
     FACE_DETECTION_MIN_NEIGHBORS = 5
     FACE_DETECTION_MIN_SIZE = (30, 30)
+    FACE_DETECTION_MAX_DIMENSION = 1024  # Longest image edge used for detection (0 = full size)
     
     # Image processing settings
     SUPPORTED_IMAGE_FORMATS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'}
@@ -28,6 +42,8 @@ class Config:
     # Performance settings
     MAX_WORKER_THREADS = 4
     BATCH_SIZE = 100
+    USE_INT8_GALLERY = False  # Match against an int8 copy of the encodings (4x less memory)
+    USE_GPU_SEARCH = False  # Search Google Drive faces on a CUDA GPU when PyTorch is installed
     
     # GUI settings
     WINDOW_SIZE = "1200x800"
@@ -51,16 +67,24 @@ class Config:
     ENABLE_GOOGLE_DRIVE = True  # Set to False to disable Google Drive integration
     GOOGLE_DRIVE_CREDENTIALS_FILE = "client_secret_707608163201-e7sej2luqsn14bnhh5ro58jdnmno0mvi.apps.googleusercontent.com.json"
     
+    # Settings dict built by get_config_dict, reset whenever settings change
+    _CACHED = None
+    
+    # Settings file read once by ensure_loaded
+    _CONFIG_PATH = Path("config.json")
+    _LOADED = False
+    
     @classmethod
     def get_config_dict(cls) -> Dict[str, Any]:
         """
         Get configuration as dictionary.
         """
-        config = {}
-        for attr in dir(cls):
-            if not attr.startswith('_') and not callable(getattr(cls, attr)):
-                config[attr] = getattr(cls, attr)
-        return config
+        if cls._CACHED is None:
+            cls._CACHED = {
+                attr: value for attr, value in sorted(vars(cls).items())
+                if not attr.startswith('_') and not isinstance(value, (classmethod, staticmethod)) and not callable(value)
+            }
+        return dict(cls._CACHED)
     
     @classmethod
     def update_from_dict(cls, config_dict: Dict[str, Any]):
@@ -70,13 +94,13 @@ class Config:
         for key, value in config_dict.items():
             if hasattr(cls, key):
                 setattr(cls, key, value)
+        cls._CACHED = None
     
     @classmethod
     def save_to_file(cls, file_path: str = "config.json"):
         """
         Save configuration to JSON file.
         """
-        import json
         config_dict = cls.get_config_dict()
         
         # Convert sets to lists for JSON serialization
@@ -91,14 +115,11 @@ class Config:
         """
         Load configuration from JSON file.
         """
-        import json
-        
         if not os.path.exists(file_path):
             return
         
         try:
-            with open(file_path, 'r') as f:
-                config_dict = json.load(f)
+            config_dict = _json_loads(Path(file_path).read_bytes())
             
             # Convert lists back to sets
             if 'SUPPORTED_IMAGE_FORMATS' in config_dict:
@@ -108,6 +129,12 @@ class Config:
             
         except Exception as e:
             print(f"Warning: Failed to load config from {file_path}: {e}")
-
-# Load configuration from file if it exists
-Config.load_from_file()
+    
+    @classmethod
+    def ensure_loaded(cls):
+        """
+        Load config.json once, if it exists. Safe to call from every entry point.
+        """
+        if not cls._LOADED:
+            cls._LOADED = True
+            cls.load_from_file(cls._CONFIG_PATH)
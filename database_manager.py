@@ -1,94 +1,392 @@
 import sqlite3
-import json
 import numpy as np
 import os
 from typing import List, Dict, Tuple, Optional
 import logging
 from datetime import datetime
 import pickle
+import threading
+import atexit
+import weakref
+from contextlib import contextmanager
+from config import Config
+
+# Approximate search for large galleries when faiss is installed
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# Below this many faces one matrix-vector product beats an IVF index (and stays exact)
+FAISS_IVF_MIN_FACES = 50000
+# Nearest faces fetched from the IVF index before the tolerance filter
+FAISS_IVF_TOP_K = 1000
+# Inverted lists scanned per query; more is slower but misses fewer neighbours
+FAISS_IVF_NPROBE = 16
+
+# Statements shared by several methods; sqlite3 caches the prepared form per
+# connection keyed on the exact SQL text, so reusing one string keeps hits reliable
+INSERT_IMAGE_SQL = '''
+    INSERT OR REPLACE INTO images
+    (file_path, file_name, file_size, modification_time, face_count, folder_path)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_FACE_SQL = '''
+    INSERT INTO face_encodings
+    (image_id, face_index, encoding_data, confidence_score,
+     face_top, face_right, face_bottom, face_left)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Ids are bound as one JSON array so the statement text never varies with the id count
+SELECT_FACE_RECORDS_SQL = '''
+    SELECT fe.id, fe.image_id, fe.face_index,
+           fe.face_top, fe.face_right, fe.face_bottom, fe.face_left,
+           fe.confidence_score, i.file_path, i.file_name
+    FROM face_encodings fe
+    JOIN images i ON fe.image_id = i.id
+    WHERE fe.id IN (SELECT value FROM json_each(?))
+'''
+
+SCHEMA_SQL = '''
+    BEGIN;
+    
+    CREATE TABLE IF NOT EXISTS images (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_path TEXT UNIQUE NOT NULL,
+        file_name TEXT NOT NULL,
+        file_size INTEGER,
+        modification_time REAL,
+        face_count INTEGER DEFAULT 0,
+        processed_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        folder_path TEXT
+    );
+    
+    CREATE TABLE IF NOT EXISTS face_encodings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        image_id INTEGER,
+        face_index INTEGER,
+        encoding_data BLOB,
+        confidence_score REAL,
+        face_top INTEGER,
+        face_right INTEGER,
+        face_bottom INTEGER,
+        face_left INTEGER,
+        FOREIGN KEY (image_id) REFERENCES images (id) ON DELETE CASCADE
+    );
+    
+    CREATE TABLE IF NOT EXISTS search_folders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        folder_path TEXT UNIQUE NOT NULL,
+        added_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1
+    );
+    
+    -- Composite indexes cover the per-image face lookup and the up-to-date check
+    CREATE INDEX IF NOT EXISTS idx_face_enc_img_idx ON face_encodings(image_id, face_index);
+    CREATE INDEX IF NOT EXISTS idx_images_path_mtime ON images(file_path, modification_time);
+    CREATE INDEX IF NOT EXISTS idx_images_folder ON images(folder_path);
+    CREATE INDEX IF NOT EXISTS idx_search_folders_active ON search_folders(is_active);
+    CREATE INDEX IF NOT EXISTS idx_images_name ON images(file_name COLLATE NOCASE);
+    
+    COMMIT;
+'''
+
+def _encoding_to_blob(encoding: np.ndarray) -> bytes:
+    """
+    Serialize a face encoding as raw float32 bytes.
+    """
+    return np.ascontiguousarray(encoding, dtype=np.float32).tobytes()
+
+def _blob_to_encoding(blob: bytes) -> np.ndarray:
+    """
+    Deserialize a face encoding stored by _encoding_to_blob.
+    """
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def _close_if_alive(ref: weakref.ref):
+    """
+    atexit hook: close a DatabaseManager if it still exists.
+    """
+    manager = ref()
+    if manager is not None:
+        manager.close()
+
 
 class DatabaseManager:
     """
     Manages the local SQLite database for storing face encodings and image metadata.
     """
     
+    # Bumped whenever existing rows need a one-time migration (stored in PRAGMA user_version)
+    SCHEMA_VERSION = 4
+    
     def __init__(self, db_path: str = "face_database.db"):
         self.db_path = db_path
+        self._conn = None
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
+        # (face ids, float32 encoding matrix, squared row norms), built lazily
+        self._encoding_cache = None
+        # (face ids, int8 encodings, row scales, squared row norms) when Config.USE_INT8_GALLERY is set
+        self._quantized_cache = None
+        # faiss IVF index over the encoding matrix, built lazily for large galleries
+        self._faiss_index = None
+        # file_path -> modification_time of every indexed image, built lazily
+        self._processed_index = None
+        # Whether the images_fts full-text table could be created
+        self._fts_available = False
         self.init_database()
+        # Close at exit through a weak reference, so the hook neither keeps this manager
+        # alive nor touches one that was already garbage collected
+        atexit.register(_close_if_alive, weakref.ref(self))
+    
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open a connection in autocommit mode with the performance pragmas applied.
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                               cached_statements=256)
+        
+        # page_size can only change before the first page is written, and
+        # must be set before switching to WAL
+        if conn.execute('PRAGMA page_count').fetchone()[0] == 0:
+            conn.execute('PRAGMA page_size=8192')
+            
+            # A cached encoding matrix left over from a deleted database is stale
+            if os.path.exists(self._encoding_sidecar_path()):
+                os.remove(self._encoding_sidecar_path())
+        
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-65536')
+        conn.execute('PRAGMA mmap_size=268435456')
+        # Keep dirty pages of large batch transactions in memory until commit
+        conn.execute('PRAGMA cache_spill=0')
+        # INSERT OR REPLACE only fires the images_fts delete trigger with recursive triggers on
+        conn.execute('PRAGMA recursive_triggers=ON')
+        # Makes ON DELETE CASCADE remove an image's faces, including when
+        # INSERT OR REPLACE re-indexes it
+        conn.execute('PRAGMA foreign_keys=ON')
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """
+        Use the shared connection outside of a managed transaction.
+        Statements commit individually; the connection lock is held for the block.
+        """
+        with self._lock:
+            yield self._conn
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Group several writes into a single transaction on the shared connection.
+        Nested use joins the outermost transaction.
+        """
+        with self._lock:
+            if self._transaction_depth == 0:
+                self._conn.execute('BEGIN IMMEDIATE')
+            self._transaction_depth += 1
+            try:
+                yield self._conn
+            except Exception:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    self._conn.execute('ROLLBACK')
+                    self.invalidate_caches()
+                raise
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._conn.execute('COMMIT')
+    
+    def close(self):
+        """
+        Close the shared database connection.
+        """
+        with self._lock:
+            if self._conn is not None:
+                # Refresh query planner statistics where they have drifted
+                try:
+                    self._conn.execute('PRAGMA optimize')
+                except sqlite3.Error as e:
+                    logging.warning(f"PRAGMA optimize failed: {str(e)}")
+                self._conn.close()
+                self._conn = None
+    
+    def invalidate_caches(self):
+        """
+        Drop in-memory caches of table contents.
+        Call after modifying images or face_encodings through another connection.
+        """
+        with self._lock:
+            self._encoding_cache = None
+            self._quantized_cache = None
+            self._faiss_index = None
+            self._processed_index = None
+    
+    def analyze(self):
+        """
+        Refresh query planner statistics, e.g. after a large batch of inserts.
+        """
+        try:
+            with self._lock:
+                self._conn.execute('ANALYZE face_encodings')
+                self._conn.execute('ANALYZE images')
+        
+        except Exception as e:
+            logging.error(f"Error analyzing database: {str(e)}")
+    
+    def vacuum(self) -> bool:
+        """
+        Rebuild the database file to reclaim space left by deleted rows.
+        """
+        try:
+            with self._lock:
+                self._conn.execute('VACUUM')
+            
+            return True
+        
+        except Exception as e:
+            logging.error(f"Error vacuuming database: {str(e)}")
+            return False
     
     def init_database(self):
         """
         Initialize the database with required tables.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Images table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS images (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    file_path TEXT UNIQUE NOT NULL,
-                    file_name TEXT NOT NULL,
-                    file_size INTEGER,
-                    modification_time REAL,
-                    face_count INTEGER DEFAULT 0,
-                    processed_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    folder_path TEXT
-                )
-            ''')
+            with self._lock:
+                if self._conn is None:
+                    self._conn = self._connect()
+                    self.invalidate_caches()
+                
+                # Tables and indexes, created in one transaction
+                try:
+                    self._conn.executescript(SCHEMA_SQL)
+                except sqlite3.Error:
+                    if self._conn.in_transaction:
+                        self._conn.execute('ROLLBACK')
+                    raise
+                
+                self._fts_available = self._create_name_search_table()
+                
+                self._migrate_schema()
+        
+        except Exception as e:
+            logging.error(f"Error initializing database: {str(e)}")
+    
+    def _create_name_search_table(self) -> bool:
+        """
+        Create the trigram full-text index over image names, kept in sync with
+        the images table by triggers. Returns False if this SQLite lacks FTS5.
+        """
+        try:
+            is_new = not self._table_exists('images_fts')
             
-            # Face encodings table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS face_encodings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    image_id INTEGER,
-                    face_index INTEGER,
-                    encoding_data BLOB,
-                    face_location TEXT,
-                    confidence_score REAL,
-                    FOREIGN KEY (image_id) REFERENCES images (id) ON DELETE CASCADE
-                )
+            self._conn.executescript('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS images_fts USING fts5(
+                    file_name, folder_path, content='images', content_rowid='id', tokenize='trigram'
+                );
+                
+                CREATE TRIGGER IF NOT EXISTS images_fts_insert AFTER INSERT ON images BEGIN
+                    INSERT INTO images_fts (rowid, file_name, folder_path)
+                    VALUES (new.id, new.file_name, new.folder_path);
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS images_fts_delete AFTER DELETE ON images BEGIN
+                    INSERT INTO images_fts (images_fts, rowid, file_name, folder_path)
+                    VALUES ('delete', old.id, old.file_name, old.folder_path);
+                END;
+                
+                CREATE TRIGGER IF NOT EXISTS images_fts_update AFTER UPDATE ON images BEGIN
+                    INSERT INTO images_fts (images_fts, rowid, file_name, folder_path)
+                    VALUES ('delete', old.id, old.file_name, old.folder_path);
+                    INSERT INTO images_fts (rowid, file_name, folder_path)
+                    VALUES (new.id, new.file_name, new.folder_path);
+                END;
             ''')
             
-            # Search folders table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS search_folders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    folder_path TEXT UNIQUE NOT NULL,
-                    added_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1
+            if is_new:
+                self._conn.execute("INSERT INTO images_fts (images_fts) VALUES ('rebuild')")
+            
+            return True
+        
+        except sqlite3.Error as e:
+            logging.warning(f"Full-text name search unavailable, falling back to LIKE: {str(e)}")
+            return False
+    
+    def _migrate_schema(self):
+        """
+        Upgrade rows written by older versions to the current SCHEMA_VERSION.
+        """
+        version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            return
+        
+        import json
+        
+        with self.transaction() as conn:
+            if version < 1:
+                # Encodings used to be pickled float64 arrays
+                rows = conn.execute('SELECT id, encoding_data FROM face_encodings').fetchall()
+                conn.executemany(
+                    'UPDATE face_encodings SET encoding_data = ? WHERE id = ?',
+                    [(_encoding_to_blob(pickle.loads(blob)), face_id) for face_id, blob in rows]
                 )
-            ''')
             
-            # Create indexes for better performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_images_path ON images(file_path)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_face_encodings_image_id ON face_encodings(image_id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_search_folders_active ON search_folders(is_active)')
+            if version < 2:
+                # Superseded by the composite indexes created in init_database
+                conn.execute('DROP INDEX IF EXISTS idx_images_path')
+                conn.execute('DROP INDEX IF EXISTS idx_face_encodings_image_id')
+                conn.execute('ANALYZE')
             
-            conn.commit()
-            conn.close()
+            if version < 3:
+                # Face locations move from a JSON text column to four integer columns
+                columns = {row[1] for row in conn.execute('PRAGMA table_info(face_encodings)')}
+                for column in ('face_top', 'face_right', 'face_bottom', 'face_left'):
+                    if column not in columns:
+                        conn.execute(f'ALTER TABLE face_encodings ADD COLUMN {column} INTEGER')
+                
+                # Databases created since then have no face_location column at all
+                if 'face_location' in columns:
+                    rows = conn.execute(
+                        'SELECT id, face_location FROM face_encodings WHERE face_location IS NOT NULL'
+                    ).fetchall()
+                    conn.executemany(
+                        '''UPDATE face_encodings
+                           SET face_top = ?, face_right = ?, face_bottom = ?, face_left = ?, face_location = NULL
+                           WHERE id = ?''',
+                        [(*json.loads(location), face_id) for face_id, location in rows]
+                    )
             
-        except Exception as e:
-            logging.error(f"Error initializing database: {str(e)}")
+            if version < 4:
+                # Without foreign key enforcement re-indexed images left their old faces behind
+                conn.execute('DELETE FROM face_encodings WHERE image_id NOT IN (SELECT id FROM images)')
+            
+            conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+        
+        logging.info(f"Migrated database schema from version {version} to {self.SCHEMA_VERSION}")
     
     def add_search_folder(self, folder_path: str) -> bool:
         """
         Add a folder to the search scope.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO search_folders (folder_path, is_active)
-                VALUES (?, 1)
-            ''', (folder_path,))
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                cursor.execute('''
+                    INSERT OR REPLACE INTO search_folders (folder_path, is_active)
+                    VALUES (?, 1)
+                ''', (folder_path,))
             
-            conn.commit()
-            conn.close()
             return True
-            
+        
         except Exception as e:
             logging.error(f"Error adding search folder {folder_path}: {str(e)}")
             return False
@@ -98,15 +396,14 @@ class DatabaseManager:
         Get all active search folders.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT folder_path FROM search_folders WHERE is_active = 1')
-            folders = [row[0] for row in cursor.fetchall()]
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                cursor.execute('SELECT folder_path FROM search_folders WHERE is_active = 1')
+                folders = [row[0] for row in cursor.fetchall()]
             
-            conn.close()
             return folders
-            
+        
         except Exception as e:
             logging.error(f"Error getting search folders: {str(e)}")
             return []
@@ -116,88 +413,108 @@ class DatabaseManager:
         Remove a folder from the search scope.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('UPDATE search_folders SET is_active = 0 WHERE folder_path = ?', (folder_path,))
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                cursor.execute('UPDATE search_folders SET is_active = 0 WHERE folder_path = ?', (folder_path,))
             
-            conn.commit()
-            conn.close()
             return True
-            
+        
         except Exception as e:
             logging.error(f"Error removing search folder {folder_path}: {str(e)}")
             return False
     
-    def add_image_record(self, file_path: str, file_name: str, file_size: int, 
+    def add_image_record(self, file_path: str, file_name: str, file_size: int,
                         modification_time: float, face_count: int, folder_path: str) -> Optional[int]:
         """
         Add an image record to the database.
         Returns the image ID if successful.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO images 
-                (file_path, file_name, file_size, modification_time, face_count, folder_path)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (file_path, file_name, file_size, modification_time, face_count, folder_path))
-            
-            image_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                cursor.execute(INSERT_IMAGE_SQL, (file_path, file_name, file_size, modification_time, face_count, folder_path))
+                
+                image_id = cursor.lastrowid
+                
+                # Replacing an existing record cascades to its old faces
+                self._encoding_cache = None
+                self._quantized_cache = None
+                self._faiss_index = None
+                if self._processed_index is not None:
+                    self._processed_index[file_path] = modification_time
             
             return image_id
-            
+        
         except Exception as e:
             logging.error(f"Error adding image record {file_path}: {str(e)}")
             return None
     
-    def add_face_encoding(self, image_id: int, face_index: int, encoding: np.ndarray, 
+    def add_face_encoding(self, image_id: int, face_index: int, encoding: np.ndarray,
                          face_location: Tuple, confidence_score: float = 1.0) -> bool:
         """
         Add a face encoding to the database.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             # Serialize the encoding
-            encoding_blob = pickle.dumps(encoding)
-            location_json = json.dumps(face_location)
+            encoding_blob = _encoding_to_blob(encoding)
             
-            cursor.execute('''
-                INSERT INTO face_encodings 
-                (image_id, face_index, encoding_data, face_location, confidence_score)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (image_id, face_index, encoding_blob, location_json, confidence_score))
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                cursor.execute(INSERT_FACE_SQL, (image_id, face_index, encoding_blob, confidence_score, *face_location))
+                
+                self._encoding_cache = None
+                self._quantized_cache = None
+                self._faiss_index = None
             
-            conn.commit()
-            conn.close()
             return True
-            
+        
         except Exception as e:
             logging.error(f"Error adding face encoding for image {image_id}: {str(e)}")
             return False
     
-    def get_image_by_path(self, file_path: str) -> Optional[Dict]:
+    def add_face_encodings_bulk(self, image_id: int, face_records: List[Tuple[Tuple, np.ndarray]],
+                                confidence_score: float = 1.0) -> bool:
         """
-        Get image record by file path.
+        Add all face encodings of an image in a single transaction.
+        face_records is a list of (face_location, encoding) pairs in face index order.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            rows = [
+                (image_id, face_index, _encoding_to_blob(encoding), confidence_score, *face_location)
+                for face_index, (face_location, encoding) in enumerate(face_records)
+            ]
             
-            cursor.execute('''
-                SELECT id, file_path, file_name, file_size, modification_time, 
-                       face_count, processed_time, folder_path
-                FROM images WHERE file_path = ?
-            ''', (file_path,))
+            with self.transaction() as conn:
+                conn.executemany(INSERT_FACE_SQL, rows)
+                
+                self._encoding_cache = None
+                self._quantized_cache = None
+                self._faiss_index = None
             
-            row = cursor.fetchone()
-            conn.close()
+            return True
+        
+        except Exception as e:
+            logging.error(f"Error adding face encodings for image {image_id}: {str(e)}")
+            return False
+    
+    def get_image_by_path(self, file_path: str) -> Optional[Dict]:
+        """
+        Get image record by file path.
+        """
+        try:
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                cursor.execute('''
+                    SELECT id, file_path, file_name, file_size, modification_time,
+                           face_count, processed_time, folder_path
+                    FROM images WHERE file_path = ?
+                ''', (file_path,))
+                
+                row = cursor.fetchone()
             
             if row:
                 return {
@@ -211,79 +528,426 @@ class DatabaseManager:
                     'folder_path': row[7]
                 }
             return None
-            
+        
         except Exception as e:
             logging.error(f"Error getting image by path {file_path}: {str(e)}")
             return None
     
+    def search_by_name(self, text: str, prefix_only: bool = False, limit: int = 100) -> List[Dict]:
+        """
+        Find images whose file name contains text (case-insensitive).
+        With prefix_only, only names starting with text are returned.
+        """
+        try:
+            columns = '''
+                SELECT i.id, i.file_path, i.file_name, i.file_size, i.modification_time,
+                       i.face_count, i.processed_time, i.folder_path
+            '''
+            escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                if prefix_only:
+                    # Range scan on idx_images_name
+                    cursor.execute(columns + '''
+                        FROM images i WHERE i.file_name LIKE ? ESCAPE '\\'
+                        ORDER BY i.file_name COLLATE NOCASE LIMIT ?
+                    ''', (escaped + '%', limit))
+                elif self._fts_available and len(text) >= 3:
+                    # Trigram index answers substring queries of three or more characters
+                    cursor.execute(columns + '''
+                        FROM images_fts f JOIN images i ON i.id = f.rowid
+                        WHERE images_fts MATCH ?
+                        ORDER BY i.file_name COLLATE NOCASE LIMIT ?
+                    ''', ('file_name : "' + text.replace('"', '""') + '"', limit))
+                else:
+                    cursor.execute(columns + '''
+                        FROM images i WHERE i.file_name LIKE ? ESCAPE '\\'
+                        ORDER BY i.file_name COLLATE NOCASE LIMIT ?
+                    ''', ('%' + escaped + '%', limit))
+                
+                rows = cursor.fetchall()
+            
+            return [
+                {
+                    'id': row[0],
+                    'file_path': row[1],
+                    'file_name': row[2],
+                    'file_size': row[3],
+                    'modification_time': row[4],
+                    'face_count': row[5],
+                    'processed_time': row[6],
+                    'folder_path': row[7]
+                }
+                for row in rows
+            ]
+        
+        except Exception as e:
+            logging.error(f"Error searching images by name {text}: {str(e)}")
+            return []
+    
     def get_all_face_encodings(self) -> List[Dict]:
         """
         Get all face encodings from the database.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT fe.id, fe.image_id, fe.face_index, fe.encoding_data, 
-                       fe.face_location, fe.confidence_score, i.file_path, i.file_name
-                FROM face_encodings fe
-                JOIN images i ON fe.image_id = i.id
-            ''')
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                cursor.execute('''
+                    SELECT fe.id, fe.image_id, fe.face_index, fe.encoding_data,
+                           fe.face_top, fe.face_right, fe.face_bottom, fe.face_left,
+                           fe.confidence_score, i.file_path, i.file_name
+                    FROM face_encodings fe
+                    JOIN images i ON fe.image_id = i.id
+                ''')
+                
+                rows = cursor.fetchall()
             
             encodings = []
-            for row in cursor.fetchall():
-                encoding = pickle.loads(row[3])
-                face_location = json.loads(row[4])
-                
+            for row in rows:
                 encodings.append({
                     'id': row[0],
                     'image_id': row[1],
                     'face_index': row[2],
-                    'encoding': encoding,
-                    'face_location': face_location,
-                    'confidence_score': row[5],
-                    'file_path': row[6],
-                    'file_name': row[7]
+                    'encoding': _blob_to_encoding(row[3]),
+                    'face_location': row[4:8],
+                    'confidence_score': row[8],
+                    'file_path': row[9],
+                    'file_name': row[10]
                 })
             
-            conn.close()
             return encodings
-            
+        
         except Exception as e:
             logging.error(f"Error getting all face encodings: {str(e)}")
             return []
     
+    def _encoding_sidecar_path(self) -> str:
+        """
+        Path of the file caching the encoding matrix between runs.
+        """
+        return self.db_path + '.encodings.npz'
+    
+    def _load_encoding_sidecar(self, key: Tuple[int, int]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Load the cached encoding matrix if it was saved for the current table contents.
+        """
+        path = self._encoding_sidecar_path()
+        if not os.path.exists(path):
+            return None
+        
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if tuple(data['key'].tolist()) != key:
+                    return None
+                return data['ids'], data['matrix']
+        
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable encoding cache {path}: {str(e)}")
+            return None
+    
+    def _save_encoding_sidecar(self, key: Tuple[int, int], ids: np.ndarray, matrix: np.ndarray):
+        """
+        Save the encoding matrix so the next start can skip decoding every row.
+        """
+        path = self._encoding_sidecar_path()
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, key=np.array(key, dtype=np.int64), ids=ids, matrix=matrix)
+            os.replace(tmp_path, path)
+        
+        except Exception as e:
+            logging.warning(f"Could not save encoding cache {path}: {str(e)}")
+    
+    def _read_face_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Stream every face into preallocated arrays, a chunk of rows at a time.
+        The caller must hold self._lock.
+        """
+        cursor = self._conn.cursor()
+        cursor.arraysize = 10000
+        
+        cursor.execute('SELECT COUNT(*) FROM face_encodings')
+        count = cursor.fetchone()[0]
+        
+        ids = np.empty(count, dtype=np.int64)
+        locations = np.empty((count, 4), dtype=np.int32)
+        encodings = np.empty((count, 128), dtype=np.float32)
+        
+        cursor.execute('''
+            SELECT id, face_top, face_right, face_bottom, face_left, encoding_data
+            FROM face_encodings ORDER BY id
+        ''')
+        
+        start = 0
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            
+            end = start + len(rows)
+            ids[start:end] = [row[0] for row in rows]
+            locations[start:end] = [row[1:5] for row in rows]
+            encodings[start:end] = np.frombuffer(b''.join(row[5] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+            start = end
+        
+        return encodings, locations, ids
+    
+    def get_face_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get all faces as (N x 128 float32 encodings, N x 4 int32 locations, N face ids),
+        with locations as (top, right, bottom, left).
+        """
+        try:
+            with self._lock:
+                return self._read_face_arrays()
+        
+        except Exception as e:
+            logging.error(f"Error reading face arrays: {str(e)}")
+            return np.empty((0, 128), dtype=np.float32), np.empty((0, 4), dtype=np.int32), np.empty(0, dtype=np.int64)
+    
+    def get_encoding_matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get all face encodings as (face ids, N x D float32 matrix).
+        The matrix is cached in memory until faces are added or deleted.
+        """
+        try:
+            with self._lock:
+                if self._encoding_cache is None:
+                    cursor = self._conn.cursor()
+                    
+                    # Ids only ever grow (AUTOINCREMENT), so count + max id identify the row set
+                    cursor.execute('SELECT COUNT(*), COALESCE(MAX(id), 0) FROM face_encodings')
+                    key = tuple(cursor.fetchone())
+                    
+                    cached = self._load_encoding_sidecar(key)
+                    if cached is not None:
+                        ids, matrix = cached
+                    else:
+                        matrix, _, ids = self._read_face_arrays()
+                        self._save_encoding_sidecar(key, ids, matrix)
+                    
+                    sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+                    self._encoding_cache = (ids, matrix, sq_norms)
+                
+                ids, matrix, _ = self._encoding_cache
+            
+            return ids, matrix
+        
+        except Exception as e:
+            logging.error(f"Error building face encoding matrix: {str(e)}")
+            return np.empty(0, dtype=np.int64), np.empty((0, 128), dtype=np.float32)
+    
+    def match_query(self, query_encoding: np.ndarray, tolerance: float = 0.6,
+                    quantized_query: Optional[Tuple[np.ndarray, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find all stored faces within tolerance (Euclidean distance) of the query.
+        quantized_query is an optional quantize_query(query_encoding) result, used by the
+        int8 gallery so a query searched repeatedly is quantized only once.
+        Returns (face ids, distances) sorted from closest to farthest.
+        """
+        if Config.USE_INT8_GALLERY:
+            return self._match_query_int8(query_encoding, tolerance, quantized_query)
+        
+        with self._lock:
+            ids, matrix = self.get_encoding_matrix()
+            sq_norms = self._encoding_cache[2] if self._encoding_cache is not None else None
+            index = self._get_faiss_index(matrix) if faiss is not None and len(matrix) >= FAISS_IVF_MIN_FACES else None
+        
+        if index is not None:
+            return self._match_query_faiss(index, ids, query_encoding, tolerance)
+        
+        if len(ids) == 0 or sq_norms is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        query = np.asarray(query_encoding, dtype=np.float32)
+        
+        # |m - q|^2 = |m|^2 - 2 m.q + |q|^2, a single matrix-vector product for all rows
+        sq_distances = sq_norms - 2.0 * (matrix @ query) + np.dot(query, query)
+        distances = np.sqrt(np.maximum(sq_distances, 0.0))
+        
+        within = np.flatnonzero(distances <= tolerance)
+        order = within[np.argsort(distances[within], kind='stable')]
+        return ids[order], distances[order]
+    
+    def _get_quantized_gallery(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Build (or return the cached) int8 copy of all encodings with one scale per row.
+        The caller must hold self._lock.
+        """
+        if self._quantized_cache is None:
+            encodings, _, ids = self._read_face_arrays()
+            
+            scales = np.abs(encodings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            quantized = np.rint(encodings / scales[:, np.newaxis]).astype(np.int8)
+            sq_norms = np.einsum('ij,ij->i', quantized, quantized, dtype=np.int32) * scales ** 2
+            
+            self._quantized_cache = (ids, quantized, scales.astype(np.float32), sq_norms.astype(np.float32))
+        
+        return self._quantized_cache
+    
+    def _get_faiss_index(self, matrix: np.ndarray):
+        """
+        Build (or return the cached) IVF index over the encoding matrix.
+        The caller must hold self._lock.
+        """
+        if self._faiss_index is None:
+            try:
+                nlist = max(64, int(np.sqrt(len(matrix))))
+                index = faiss.IndexIVFFlat(faiss.IndexFlatL2(matrix.shape[1]), matrix.shape[1], nlist)
+                index.train(matrix)
+                index.add(matrix)
+                index.nprobe = FAISS_IVF_NPROBE
+                self._faiss_index = index
+            except Exception as e:
+                logging.error(f"Error building faiss index: {str(e)}")
+                return None
+        
+        return self._faiss_index
+    
+    def _match_query_faiss(self, index, ids: np.ndarray, query_encoding: np.ndarray,
+                           tolerance: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        match_query through the IVF index: the nearest FAISS_IVF_TOP_K faces, then the
+        tolerance filter. Approximate, so a rare true match can be missed.
+        """
+        query = np.asarray(query_encoding, dtype=np.float32).reshape(1, -1)
+        
+        # faiss returns squared distances, nearest first; -1 rows pad short result lists
+        sq_distances, rows = index.search(query, min(FAISS_IVF_TOP_K, index.ntotal))
+        sq_distances, rows = sq_distances[0], rows[0]
+        
+        keep = (rows >= 0) & (sq_distances <= tolerance * tolerance)
+        return ids[rows[keep]], np.sqrt(np.maximum(sq_distances[keep], 0.0))
+    
+    @staticmethod
+    def quantize_query(query_encoding: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Quantize a query encoding to int8 with a single scale, like the int8 gallery rows.
+        Returns (int8 vector, scale).
+        """
+        query = np.asarray(query_encoding, dtype=np.float32)
+        query_scale = float(np.abs(query).max()) / 127.0 or 1.0
+        return np.rint(query / query_scale).astype(np.int8), query_scale
+    
+    def _match_query_int8(self, query_encoding: np.ndarray, tolerance: float,
+                          quantized_query: Optional[Tuple[np.ndarray, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        match_query against the int8 gallery. Candidates are found with integer dot
+        products, then rescored exactly from the stored float32 encodings.
+        """
+        try:
+            with self._lock:
+                ids, quantized, scales, sq_norms = self._get_quantized_gallery()
+            
+            if len(ids) == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            
+            query = np.asarray(query_encoding, dtype=np.float32)
+            if quantized_query is None:
+                quantized_query = self.quantize_query(query)
+            quantized_query, query_scale = quantized_query
+            
+            # Integer products accumulate in int32 so they cannot overflow
+            dots = np.einsum('ij,j->i', quantized, quantized_query, dtype=np.int32)
+            query_sq_norm = float(np.dot(quantized_query.astype(np.int32), quantized_query)) * query_scale ** 2
+            
+            sq_distances = sq_norms - 2.0 * query_scale * scales * dots + query_sq_norm
+            approx_distances = np.sqrt(np.maximum(sq_distances, 0.0))
+            
+            # Rounding moves a vector by at most half a step per component, so this
+            # margin never drops a true match
+            margin = 0.5 * np.sqrt(quantized.shape[1]) * (scales + query_scale)
+            candidate_ids = ids[approx_distances <= tolerance + margin]
+            
+            if len(candidate_ids) == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                id_array = '[' + ','.join(str(int(face_id)) for face_id in candidate_ids) + ']'
+                cursor.execute(
+                    'SELECT id, encoding_data FROM face_encodings WHERE id IN (SELECT value FROM json_each(?))',
+                    (id_array,)
+                )
+                rows = cursor.fetchall()
+            
+            candidate_ids = np.array([row[0] for row in rows], dtype=np.int64)
+            candidates = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+            distances = np.linalg.norm(candidates - query, axis=1)
+            
+            within = np.flatnonzero(distances <= tolerance)
+            order = within[np.argsort(distances[within], kind='stable')]
+            return candidate_ids[order], distances[order]
+        
+        except Exception as e:
+            logging.error(f"Error matching against int8 gallery: {str(e)}")
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    
+    def get_face_records(self, face_ids: List[int]) -> Dict[int, Dict]:
+        """
+        Get face metadata (without encodings) for the given face ids, keyed by face id.
+        """
+        try:
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                id_array = '[' + ','.join(str(int(face_id)) for face_id in face_ids) + ']'
+                cursor.execute(SELECT_FACE_RECORDS_SQL, (id_array,))
+                rows = cursor.fetchall()
+            
+            records = {}
+            for row in rows:
+                records[row[0]] = {
+                    'id': row[0],
+                    'image_id': row[1],
+                    'face_index': row[2],
+                    'face_location': row[3:7],
+                    'confidence_score': row[7],
+                    'file_path': row[8],
+                    'file_name': row[9]
+                }
+            
+            return records
+        
+        except Exception as e:
+            logging.error(f"Error getting face records: {str(e)}")
+            return {}
+    
     def get_face_encodings_by_image(self, image_id: int) -> List[Dict]:
         """
         Get face encodings for a specific image.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT id, face_index, encoding_data, face_location, confidence_score
-                FROM face_encodings WHERE image_id = ?
-                ORDER BY face_index
-            ''', (image_id,))
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                cursor.execute('''
+                    SELECT id, face_index, encoding_data, confidence_score,
+                           face_top, face_right, face_bottom, face_left
+                    FROM face_encodings WHERE image_id = ?
+                    ORDER BY face_index
+                ''', (image_id,))
+                
+                rows = cursor.fetchall()
             
             encodings = []
-            for row in cursor.fetchall():
-                encoding = pickle.loads(row[2])
-                face_location = json.loads(row[3])
-                
+            for row in rows:
                 encodings.append({
                     'id': row[0],
                     'face_index': row[1],
-                    'encoding': encoding,
-                    'face_location': face_location,
-                    'confidence_score': row[4]
+                    'encoding': _blob_to_encoding(row[2]),
+                    'face_location': row[4:8],
+                    'confidence_score': row[3]
                 })
             
-            conn.close()
             return encodings
-            
+        
         except Exception as e:
             logging.error(f"Error getting face encodings for image {image_id}: {str(e)}")
             return []
@@ -293,11 +957,20 @@ class DatabaseManager:
         Check if an image has been processed and is up to date.
         """
         try:
-            image_record = self.get_image_by_path(file_path)
-            if image_record and image_record['modification_time'] >= modification_time:
-                return True
-            return False
+            with self._lock:
+                if self._processed_index is None:
+                    cursor = self._conn.cursor()
+                    
+                    # One scan of idx_images_path_mtime instead of a query per file
+                    cursor.execute('SELECT file_path, modification_time FROM images')
+                    self._processed_index = {
+                        path: mtime for path, mtime in cursor.fetchall() if mtime is not None
+                    }
+                
+                processed_time = self._processed_index.get(file_path)
             
+            return processed_time is not None and processed_time >= modification_time
+        
         except Exception as e:
             logging.error(f"Error checking if image is processed {file_path}: {str(e)}")
             return False
@@ -307,27 +980,19 @@ class DatabaseManager:
         Delete an image and all its associated face encodings.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get image ID first
-            cursor.execute('SELECT id FROM images WHERE file_path = ?', (file_path,))
-            row = cursor.fetchone()
-            
-            if row:
-                image_id = row[0]
-                
-                # Delete face encodings
-                cursor.execute('DELETE FROM face_encodings WHERE image_id = ?', (image_id,))
+            with self.transaction() as conn:
+                # Face encodings are removed by ON DELETE CASCADE
+                cursor = conn.execute('DELETE FROM images WHERE file_path = ?', (file_path,))
                 
-                # Delete image record
-                cursor.execute('DELETE FROM images WHERE id = ?', (image_id,))
-                
-                conn.commit()
+                if cursor.rowcount:
+                    self._encoding_cache = None
+                    self._quantized_cache = None
+                    self._faiss_index = None
+                    if self._processed_index is not None:
+                        self._processed_index.pop(file_path, None)
             
-            conn.close()
             return True
-            
+        
         except Exception as e:
             logging.error(f"Error deleting image and faces {file_path}: {str(e)}")
             return False
@@ -337,25 +1002,26 @@ class DatabaseManager:
         Get database statistics.
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Count total images
-            cursor.execute("SELECT COUNT(*) FROM images")
-            total_images = cursor.fetchone()[0]
-            
-            # Count total faces
-            cursor.execute("SELECT COUNT(*) FROM face_encodings")
-            total_faces = cursor.fetchone()[0]
-            
-            # Count active folders
-            cursor.execute("SELECT COUNT(*) FROM search_folders")
-            active_folders = cursor.fetchone()[0]
-            
-            # Get database file size
-            database_size = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                # Count total images
+                cursor.execute("SELECT COUNT(*) FROM images")
+                total_images = cursor.fetchone()[0]
+                
+                # Count total faces
+                cursor.execute("SELECT COUNT(*) FROM face_encodings")
+                total_faces = cursor.fetchone()[0]
+                
+                # Count active folders
+                cursor.execute("SELECT COUNT(*) FROM search_folders")
+                active_folders = cursor.fetchone()[0]
             
-            conn.close()
+            # Get database file size (including the write-ahead log)
+            database_size = 0
+            for path in (self.db_path, self.db_path + '-wal'):
+                if os.path.exists(path):
+                    database_size += os.path.getsize(path)
             
             return {
                 'total_images': total_images,
@@ -363,7 +1029,7 @@ class DatabaseManager:
                 'active_folders': active_folders,
                 'database_size': database_size
             }
-            
+        
         except Exception as e:
             logging.error(f"Error getting database stats: {str(e)}")
             return {
@@ -372,61 +1038,22 @@ class DatabaseManager:
                 'active_folders': 0,
                 'database_size': 0
             }
-
-    def get_all_face_encodings(self) -> List[Dict]:
-        """
-        Get all face encodings from the database.
-        """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT fe.id, fe.image_id, fe.face_index, fe.encoding_data, 
-                       fe.face_location, fe.confidence_score, i.file_path, i.file_name
-                FROM face_encodings fe
-                JOIN images i ON fe.image_id = i.id
-            ''')
-            
-            encodings = []
-            for row in cursor.fetchall():
-                encoding = pickle.loads(row[3])
-                face_location = json.loads(row[4])
-                
-                encodings.append({
-                    'id': row[0],
-                    'image_id': row[1],
-                    'face_index': row[2],
-                    'encoding': encoding,
-                    'face_location': face_location,
-                    'confidence_score': row[5],
-                    'file_path': row[6],
-                    'file_name': row[7]
-                })
-            
-            conn.close()
-            return encodings
-            
-        except Exception as e:
-            logging.error(f"Error getting all face encodings: {str(e)}")
-            return []
     
     def _table_exists(self, table_name: str) -> bool:
         """Check if a table exists in the database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name=?
-            ''', (table_name,))
-            
-            result = cursor.fetchone()
-            conn.close()
+            with self._lock:
+                cursor = self._conn.cursor()
+                
+                cursor.execute('''
+                    SELECT name FROM sqlite_master
+                    WHERE type='table' AND name=?
+                ''', (table_name,))
+                
+                result = cursor.fetchone()
             
             return result is not None
-            
+        
         except Exception as e:
             logging.error(f"Error checking if table exists: {str(e)}")
             return False
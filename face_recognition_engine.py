@@ -2,9 +2,32 @@ import face_recognition
 import numpy as np
 from PIL import Image
 import os
-from typing import List, Tuple, Dict, Optional
-import pickle
+from typing import List, Tuple, Dict, Optional, Iterator, Union
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+# Engine instance owned by each worker process of process_images_batch
+_worker_engine = None
+
+def _process_image_worker(image_path: str) -> Tuple[str, Dict]:
+    """
+    Process one image inside a worker process.
+    Module-level so it can be pickled by ProcessPoolExecutor.
+    """
+    global _worker_engine
+    if _worker_engine is None:
+        # Spawned workers start with a fresh Config
+        Config.ensure_loaded()
+        _worker_engine = FaceRecognitionEngine()
+    
+    face_data = _worker_engine.process_image_for_faces(image_path)
+    
+    # Halve the data sent back to the parent process
+    if 'face_encodings' in face_data:
+        face_data['face_encodings'] = [np.asarray(encoding, dtype=np.float32) for encoding in face_data['face_encodings']]
+    
+    return image_path, face_data
 
 class FaceRecognitionEngine:
     """
@@ -13,63 +36,45 @@ class FaceRecognitionEngine:
     
     def __init__(self):
         self.supported_formats = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'}
-        
-    def detect_faces_opencv(self, image_path: str) -> List[Tuple[int, int, int, int]]:
-        """
-        Detect faces using face_recognition library (fallback method).
-        Returns list of (x, y, width, height) tuples.
-        """
-        try:
-            # Load image and get face locations
-            image = face_recognition.load_image_file(image_path)
-            face_locations = face_recognition.face_locations(image, model="hog")
-            
-            # Convert from (top, right, bottom, left) to (x, y, width, height)
-            faces = []
-            for (top, right, bottom, left) in face_locations:
-                x, y = left, top
-                w, h = right - left, bottom - top
-                faces.append((x, y, w, h))
-            
-            return faces
-        except Exception as e:
-            logging.error(f"Error detecting faces in {image_path}: {str(e)}")
-            return []
+        self.detection_model = self._resolve_detection_model(Config.FACE_RECOGNITION_MODEL)
     
-    def extract_face_encodings(self, image_path: str) -> List[np.ndarray]:
+    @staticmethod
+    def _resolve_detection_model(model: str) -> str:
         """
-        Extract face encodings using face_recognition library.
-        Returns list of 128-dimensional face encodings.
+        Pick the face detector: "auto" uses dlib's CNN detector when dlib was
+        built with CUDA, otherwise the CPU HOG detector.
         """
+        if model != "auto":
+            return model
+        
         try:
-            # Load image
-            image = face_recognition.load_image_file(image_path)
-            
-            # Find face locations
-            face_locations = face_recognition.face_locations(image, model="hog")
-            
-            # Extract face encodings
-            face_encodings = face_recognition.face_encodings(image, face_locations)
-            
-            return face_encodings
+            import dlib
+            if getattr(dlib, 'DLIB_USE_CUDA', False) and dlib.cuda.get_num_devices() > 0:
+                return "cnn"
         except Exception as e:
-            logging.error(f"Error extracting face encodings from {image_path}: {str(e)}")
-            return []
-    
-    def get_face_locations_and_encodings(self, image_path: str) -> Tuple[List[Tuple], List[np.ndarray]]:
+            logging.debug(f"CUDA face detector unavailable: {str(e)}")
+        
+        return "hog"
+        
+    def batch_distance(self, queries: np.ndarray, gallery: np.ndarray) -> np.ndarray:
         """
-        Get both face locations and encodings for an image.
-        Returns (face_locations, face_encodings).
+        Euclidean distances between every query and every gallery encoding.
+        Returns an (M, N) matrix for M queries and N gallery encodings.
         """
-        try:
-            image = face_recognition.load_image_file(image_path)
-            face_locations = face_recognition.face_locations(image, model="hog")
-            face_encodings = face_recognition.face_encodings(image, face_locations)
-            
-            return face_locations, face_encodings
-        except Exception as e:
-            logging.error(f"Error processing {image_path}: {str(e)}")
-            return [], []
+        dtype = np.result_type(np.asarray(queries), np.asarray(gallery), np.float32)
+        queries = np.atleast_2d(np.asarray(queries, dtype=dtype))
+        gallery = np.asarray(gallery, dtype=dtype).reshape(-1, queries.shape[1])
+        
+        if queries.shape[0] == 0 or gallery.shape[0] == 0:
+            return np.empty((queries.shape[0], gallery.shape[0]), dtype=dtype)
+        
+        # |q - g|^2 = |q|^2 - 2 q.g + |g|^2, so the bulk of the work is one matrix product
+        sq_distances = queries @ gallery.T
+        sq_distances *= -2.0
+        sq_distances += np.einsum('ij,ij->i', queries, queries)[:, np.newaxis]
+        sq_distances += np.einsum('ij,ij->i', gallery, gallery)[np.newaxis, :]
+        np.maximum(sq_distances, 0.0, out=sq_distances)
+        return np.sqrt(sq_distances, out=sq_distances)
     
     def compare_faces(self, known_encoding: np.ndarray, unknown_encodings: List[np.ndarray], tolerance: float = 0.6) -> List[bool]:
         """
@@ -80,8 +85,8 @@ class FaceRecognitionEngine:
             if len(unknown_encodings) == 0:
                 return []
             
-            matches = face_recognition.compare_faces(unknown_encodings, known_encoding, tolerance=tolerance)
-            return matches
+            distances = self.batch_distance(known_encoding, unknown_encodings)[0]
+            return (distances <= tolerance).tolist()
         except Exception as e:
             logging.error(f"Error comparing faces: {str(e)}")
             return []
@@ -95,26 +100,29 @@ class FaceRecognitionEngine:
             if len(unknown_encodings) == 0:
                 return []
             
-            distances = face_recognition.face_distance(unknown_encodings, known_encoding)
+            distances = self.batch_distance(known_encoding, unknown_encodings)[0]
             return distances.tolist()
         except Exception as e:
             logging.error(f"Error calculating face distances: {str(e)}")
             return []
     
-    def extract_face_from_image(self, image_path: str, face_location: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
+    def extract_face_from_image(self, image: Union[str, np.ndarray], face_location: Tuple[int, int, int, int]) -> Optional[np.ndarray]:
         """
         Extract a specific face region from an image.
+        image: a file path, or an array already decoded (e.g. by process_image_for_faces
+        with return_image=True) so several faces can be cropped without re-reading the file
         face_location: (top, right, bottom, left)
         """
         try:
-            image = face_recognition.load_image_file(image_path)
+            if isinstance(image, str):
+                image = self._load_image(image)
             top, right, bottom, left = face_location
             
             # Extract face region
             face_image = image[top:bottom, left:right]
             return face_image
         except Exception as e:
-            logging.error(f"Error extracting face from {image_path}: {str(e)}")
+            logging.error(f"Error extracting face: {str(e)}")
             return None
     
     def is_supported_image(self, file_path: str) -> bool:
@@ -123,51 +131,119 @@ class FaceRecognitionEngine:
         """
         return os.path.splitext(file_path.lower())[1] in self.supported_formats
     
-    def process_image_for_faces(self, image_path: str) -> Dict:
+    def _load_image(self, image_path: str) -> np.ndarray:
+        """
+        Decode an image file into an RGB array.
+        """
+        with Image.open(image_path) as image:
+            return np.asarray(image.convert('RGB'))
+    
+    def _detect_faces(self, image: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """
+        Find face locations, running detection on a downscaled copy of large images.
+        Returns (top, right, bottom, left) tuples in full-resolution coordinates.
+        """
+        height, width = image.shape[:2]
+        max_dimension = Config.FACE_DETECTION_MAX_DIMENSION
+        
+        # Integer stride keeps the downscale a cheap view of the decoded pixels
+        step = max(1, -(-max(height, width) // max_dimension)) if max_dimension else 1
+        if step == 1:
+            return face_recognition.face_locations(image, model=self.detection_model)
+        
+        small_image = np.ascontiguousarray(image[::step, ::step])
+        face_locations = face_recognition.face_locations(small_image, model=self.detection_model)
+        
+        return [
+            (min(top * step, height), min(right * step, width), min(bottom * step, height), min(left * step, width))
+            for (top, right, bottom, left) in face_locations
+        ]
+    
+    def process_image_for_faces(self, image_path: str, return_image: bool = False) -> Dict:
         """
         Complete face processing for an image.
-        Returns dictionary with face locations, encodings, and metadata.
+        The file is stat'ed and decoded once; detection runs on a downscaled copy
+        and encodings are computed on the full-resolution image.
+        Returns dictionary with face locations, encodings, and metadata; with
+        return_image the decoded RGB array is included under "image".
         """
         if not self.is_supported_image(image_path):
             return {"error": "Unsupported image format"}
         
-        if not os.path.exists(image_path):
+        try:
+            file_stat = os.stat(image_path)
+        except OSError:
             return {"error": "File not found"}
         
         try:
-            face_locations, face_encodings = self.get_face_locations_and_encodings(image_path)
+            image = self._load_image(image_path)
+            face_locations = self._detect_faces(image)
+            face_encodings = face_recognition.face_encodings(image, face_locations) if face_locations else []
             
             result = {
                 "image_path": image_path,
                 "face_count": len(face_locations),
                 "face_locations": face_locations,
                 "face_encodings": face_encodings,
-                "timestamp": os.path.getmtime(image_path),
-                "file_size": os.path.getsize(image_path)
+                "timestamp": file_stat.st_mtime,
+                "file_size": file_stat.st_size
             }
+            if return_image:
+                result["image"] = image
             
             return result
         except Exception as e:
             return {"error": f"Processing failed: {str(e)}"}
     
+    def process_images_batch(self, image_paths: List[str], max_workers: Optional[int] = None) -> Iterator[Tuple[str, Dict]]:
+        """
+        Process many images in parallel worker processes.
+        Yields (image_path, face_data) in input order, as process_image_for_faces would return them.
+        """
+        if max_workers is None:
+            max_workers = Config.MAX_WORKER_THREADS
+        
+        if max_workers <= 1 or len(image_paths) <= 1:
+            for image_path in image_paths:
+                yield image_path, self.process_image_for_faces(image_path)
+            return
+        
+        # Large chunks cut IPC overhead but should not leave workers idle on small batches
+        chunksize = max(1, min(16, len(image_paths) // (max_workers * 4)))
+        
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+        try:
+            yield from executor.map(_process_image_worker, image_paths, chunksize=chunksize)
+        finally:
+            # If the caller stops early, drop the images no worker has started yet
+            executor.shutdown(wait=True, cancel_futures=True)
+    
     def save_encodings_to_file(self, encodings_data: Dict, file_path: str):
         """
-        Save face encodings data to a pickle file.
+        Save face encodings data to a compressed NumPy archive.
+        encodings_data maps names to arrays (or lists of numbers/strings), e.g.
+        {'encodings': (N, 128) array, 'file_paths': [...], 'ids': [...]}.
         """
         try:
+            arrays = {key: np.asarray(value) for key, value in encodings_data.items()}
+            for key, array in arrays.items():
+                if array.dtype == object:
+                    raise ValueError(f"'{key}' cannot be stored without pickling")
+            
             with open(file_path, 'wb') as f:
-                pickle.dump(encodings_data, f)
+                np.savez_compressed(f, **arrays)
         except Exception as e:
             logging.error(f"Error saving encodings to {file_path}: {str(e)}")
     
     def load_encodings_from_file(self, file_path: str) -> Dict:
         """
-        Load face encodings data from a pickle file.
+        Load face encodings data saved by save_encodings_to_file.
+        Returns a dict of NumPy arrays.
         """
         try:
             if os.path.exists(file_path):
-                with open(file_path, 'rb') as f:
-                    return pickle.load(f)
+                with np.load(file_path, allow_pickle=False) as data:
+                    return {key: data[key] for key in data.files}
             return {}
         except Exception as e:
             logging.error(f"Error loading encodings from {file_path}: {str(e)}")
@@ -7,20 +7,97 @@ Handles Google Drive API authentication and token management
 import os
 import json
 import logging
+import threading
+import time
+import atexit
+from datetime import datetime
 from typing import Optional, Dict, Any
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+# Faster token (de)serialization when orjson is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Allow insecure transport for localhost development
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Logging is configured by the application entry point
 logger = logging.getLogger(__name__)
 
+# Local development mode: the hardcoded folder/connection paths are used and the
+# Drive API client is never built
+HARDCODED = os.environ.get('VANITHA_HARDCODED') == '1'
+
+class _HardcodedDriveService:
+    """
+    Stand-in for the Drive service in hardcoded mode.
+    Any API use fails immediately instead of reaching the network.
+    """
+    
+    def __getattr__(self, name):
+        raise RuntimeError("Google Drive API is disabled (VANITHA_HARDCODED=1)")
+
+# Socket timeout (seconds) for Drive API requests
+HTTP_TIMEOUT = 30
+
+# Drive service cached per thread, since httplib2 connections are not thread-safe.
+# Keyed by the id of the credentials object it was built for; the service keeps
+# its credentials alive, so the id cannot be reused while it is cached.
+_service_local = threading.local()
+
+# Drive v3 discovery document, parsed once per process and shared by every thread's build
+_discovery_document: Optional[Dict[str, Any]] = None
+_discovery_lock = threading.Lock()
+
+def _get_discovery_document() -> Optional[Dict[str, Any]]:
+    """
+    Parse the Drive v3 discovery document bundled with google-api-python-client.
+    Returns None if the installed client does not ship it.
+    """
+    global _discovery_document
+    with _discovery_lock:
+        if _discovery_document is None:
+            from googleapiclient.discovery_cache import get_static_doc
+            
+            content = get_static_doc('drive', 'v3')
+            if content is not None:
+                _discovery_document = orjson.loads(content) if orjson else json.loads(content)
+        return _discovery_document
+
+def _get_shared_drive_service(credentials):
+    """
+    Return this thread's Drive service for these credentials, building it on first use.
+    Uses the discovery document bundled with google-api-python-client, parsed
+    once per process, so building never fetches it over the network. All requests from a
+    thread go through one authorized keep-alive connection, so the TLS handshake
+    is paid once instead of on every call.
+    """
+    key = id(credentials)
+    if getattr(_service_local, 'key', None) == key:
+        return _service_local.service
+    
+    # Imported here so the API client is only loaded when Drive is actually used
+    import httplib2
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build, build_from_document
+    
+    authed_http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+    document = _get_discovery_document()
+    if document is not None:
+        service = build_from_document(document, http=authed_http)
+    else:
+        service = build('drive', 'v3', http=authed_http,
+                        cache_discovery=False, static_discovery=True)
+    _service_local.key = key
+    _service_local.service = service
+    logger.debug("Google Drive service created successfully")
+    return service
+
 class GoogleDriveAuth:
     """
     Handles Google Drive API authentication and authorization
@@ -33,21 +110,37 @@ class GoogleDriveAuth:
         'https://www.googleapis.com/auth/drive.metadata.readonly'
     ]
     
+    # Minimum seconds between token file writes for routine token refreshes
+    TOKEN_WRITE_INTERVAL = 30
+    
+    # Credentials already parsed in this process, keyed by token file
+    _cached_credentials: Dict[str, Credentials] = {}
+    
     def __init__(self, credentials_file: str = 'client_secret_707608163201-e7sej2luqsn14bnhh5ro58jdnmno0mvi.apps.googleusercontent.com.json', token_file: str = 'token.json'):
         self.credentials_file = credentials_file
         self.token_file = token_file
         self.credentials = None
         self.service = None
+        self._last_token_write = 0.0
+        self._token_write_pending = False
+        atexit.register(self.flush_credentials)
         
     def load_credentials(self) -> Optional[Credentials]:
         """
         Load existing credentials from token file
         """
         try:
+            cached = self._cached_credentials.get(self.token_file)
+            if cached is not None:
+                self.credentials = cached
+                return self.credentials
+            
             if os.path.exists(self.token_file):
-                self.credentials = Credentials.from_authorized_user_file(
-                    self.token_file, self.SCOPES
-                )
+                with open(self.token_file, 'rb') as token:
+                    data = token.read()
+                token_info = orjson.loads(data) if orjson else json.loads(data)
+                self.credentials = self._credentials_from_dict(token_info)
+                self._cached_credentials[self.token_file] = self.credentials
                 logger.info("Loaded existing credentials from token file")
                 return self.credentials
         except Exception as e:
@@ -62,7 +155,7 @@ class GoogleDriveAuth:
         try:
             if self.credentials and self.credentials.expired and self.credentials.refresh_token:
                 self.credentials.refresh(Request())
-                self.save_credentials()
+                self.save_credentials(force=False)
                 logger.info("Credentials refreshed successfully")
                 return True
         except Exception as e:
@@ -70,17 +163,80 @@ class GoogleDriveAuth:
         
         return False
     
-    def save_credentials(self):
+    def save_credentials(self, force: bool = True):
         """
         Save credentials to token file
+        Unless forced, writes closer together than TOKEN_WRITE_INTERVAL are
+        deferred; the latest credentials are still used in memory and are
+        written by the next save or at exit.
         """
+        self._cached_credentials[self.token_file] = self.credentials
+        
+        if not force and time.time() - self._last_token_write < self.TOKEN_WRITE_INTERVAL:
+            self._token_write_pending = True
+            return
+        
         try:
-            with open(self.token_file, 'w') as token:
-                token.write(self.credentials.to_json())
+            token_info = self._credentials_to_dict()
+            data = orjson.dumps(token_info) if orjson else json.dumps(token_info).encode('utf-8')
+            
+            # Write a complete copy first so a crash never leaves a truncated token file
+            tmp_file = self.token_file + '.tmp'
+            with open(tmp_file, 'wb') as token:
+                token.write(data)
+                token.flush()
+                os.fsync(token.fileno())
+            os.replace(tmp_file, self.token_file)
+            self._last_token_write = time.time()
+            self._token_write_pending = False
             logger.info("Credentials saved to token file")
         except Exception as e:
             logger.error(f"Error saving credentials: {str(e)}")
     
+    def flush_credentials(self):
+        """
+        Write credentials whose save was deferred
+        """
+        if self._token_write_pending and self.credentials:
+            self.save_credentials()
+    
+    def _credentials_from_dict(self, token_info: Dict[str, Any]) -> Credentials:
+        """
+        Build Credentials from the fields written by save_credentials
+        """
+        expiry = token_info.get('expiry')
+        if expiry:
+            # google-auth keeps expiry as a naive UTC datetime
+            expiry = datetime.strptime(expiry.rstrip('Z'), '%Y-%m-%dT%H:%M:%S.%f' if '.' in expiry else '%Y-%m-%dT%H:%M:%S')
+        
+        return Credentials(
+            token=token_info.get('token'),
+            refresh_token=token_info.get('refresh_token'),
+            token_uri=token_info.get('token_uri', 'https://oauth2.googleapis.com/token'),
+            client_id=token_info['client_id'],
+            client_secret=token_info['client_secret'],
+            scopes=self.SCOPES,
+            expiry=expiry or None
+        )
+    
+    def _credentials_to_dict(self) -> Dict[str, Any]:
+        """
+        Collect the credential fields in the format of Credentials.to_json()
+        """
+        credentials = self.credentials
+        token_info = {
+            'token': credentials.token,
+            'refresh_token': credentials.refresh_token,
+            'token_uri': credentials.token_uri,
+            'client_id': credentials.client_id,
+            'client_secret': credentials.client_secret,
+            'scopes': list(credentials.scopes) if credentials.scopes else None
+        }
+        if credentials.expiry:
+            token_info['expiry'] = credentials.expiry.isoformat() + 'Z'
+        
+        return {key: value for key, value in token_info.items() if value is not None}
+    
     def get_authorization_url(self) -> str:
         """
         Get the authorization URL for OAuth flow
@@ -129,6 +285,7 @@ class GoogleDriveAuth:
             logger.info("Fetching token from authorization response")
             self._flow.fetch_token(authorization_response=authorization_response)
             self.credentials = self._flow.credentials
+            self.service = None
             
             # Validate that we have all necessary fields
             if not self.credentials.refresh_token:
@@ -166,13 +323,13 @@ class GoogleDriveAuth:
         Get authenticated Google Drive service
         """
         try:
+            if HARDCODED:
+                return _HardcodedDriveService()
+            
             if not self.is_authenticated():
                 raise ValueError("Not authenticated with Google Drive")
             
-            if not self.service:
-                self.service = build('drive', 'v3', credentials=self.credentials)
-                logger.info("Google Drive service created successfully")
-            
+            self.service = _get_shared_drive_service(self.credentials)
             return self.service
             
         except Exception as e:
@@ -210,6 +367,8 @@ class GoogleDriveAuth:
                 os.remove(self.token_file)
             
             # Reset instance variables
+            self._cached_credentials.pop(self.token_file, None)
+            self._token_write_pending = False
             self.credentials = None
             self.service = None
             
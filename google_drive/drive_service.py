@@ -4,21 +4,45 @@ Google Drive Service Module
 Handles Google Drive file operations and folder management
 """
 
-import io
 import os
 import logging
-import mimetypes
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from itertools import islice
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
-from PIL import Image
 import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from .auth import drive_auth
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Write buffer for downloaded files and size of each ranged media request
+DOWNLOAD_BUFFER_SIZE = 128 * 1024
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Files up to this size are fetched with one plain media GET instead of ranged chunks
+SMALL_DOWNLOAD_SIZE = 10 * 1024 * 1024
+
+# Concurrent downloads used by download_images
+DOWNLOAD_WORKERS = 16
+
+# Largest page the Drive files().list call returns
+MAX_PAGE_SIZE = 1000
+
+# Most calls the Drive batch endpoint accepts in one request
+MAX_BATCH_REQUESTS = 100
+
+# Escapes backslashes and single quotes in values placed inside Drive query string literals
+_DRIVE_ESCAPE = str.maketrans({"\\": "\\\\", "'": "\\'"})
+
+# Extensions counted as images in the hardcoded local Webcam folder
+LOCAL_IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'})
+
 class GoogleDriveService:
     """
     Google Drive file operations and management
@@ -35,14 +59,91 @@ class GoogleDriveService:
         'image/webp'
     ]
     
+    # Drive query clauses matching the image MIME types, built once
+    _MIME_QUERY_IMAGE = "(" + " or ".join(f"mimeType='{mime}'" for mime in IMAGE_MIME_TYPES) + ")"
+    _MIME_QUERY_COUNT = "(" + " or ".join(f"mimeType='{mime}'" for mime in IMAGE_MIME_TYPES[:3]) + ")"
+    _MIME_QUERY_FAST = "(mimeType='image/jpeg' or mimeType='image/png')"
+    
+    # Response projections: ids only for counting, full metadata for listings
+    _FIELDS_THIN = "files(id)"
+    _FIELDS_FULL = "files(id,name,mimeType,size,modifiedTime,parents,thumbnailLink)"
+    
+    # Maximum number of folders kept in the metadata cache
+    FOLDER_CACHE_SIZE = 4096
+    # Seconds the folder metadata cache is trusted before renamed or moved folders are re-read
+    FOLDER_CACHE_TTL = 60
+    
     def __init__(self):
-        self.service = None
+        # {folder_id: (name, parent_id)} in least recently used order; shared by request threads
+        self._folder_cache: "OrderedDict[str, Tuple[str, Optional[str]]]" = OrderedDict()
+        self._folders_prefetched = False
+        # time.monotonic() when the cache was last (re)started, None while it is empty
+        self._folder_cache_started: Optional[float] = None
+        self._folder_lock = threading.Lock()
+    
+    def _expire_folder_cache(self):
+        """Drop the folder metadata cache once it is older than FOLDER_CACHE_TTL"""
+        with self._folder_lock:
+            if (self._folder_cache_started is not None
+                    and time.monotonic() - self._folder_cache_started > self.FOLDER_CACHE_TTL):
+                self._folder_cache.clear()
+                self._folders_prefetched = False
+                self._folder_cache_started = None
+    
+    def _cache_folders(self, folders: List[Tuple[str, str, Optional[str]]]):
+        """Remember (folder_id, name, parent_id) entries, evicting the least recently used ones"""
+        with self._folder_lock:
+            if self._folder_cache_started is None:
+                self._folder_cache_started = time.monotonic()
+            for folder_id, name, parent_id in folders:
+                self._folder_cache[folder_id] = (name, parent_id)
+                self._folder_cache.move_to_end(folder_id)
+            while len(self._folder_cache) > self.FOLDER_CACHE_SIZE:
+                self._folder_cache.popitem(last=False)
+    
+    def _cache_folder(self, folder_id: str, name: str, parent_id: Optional[str]):
+        """Remember a folder's name and parent, evicting the least recently used entry"""
+        self._cache_folders([(folder_id, name, parent_id)])
+    
+    def _get_cached_folder(self, folder_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Look up a folder in the metadata cache"""
+        with self._folder_lock:
+            entry = self._folder_cache.get(folder_id)
+            if entry is not None:
+                self._folder_cache.move_to_end(folder_id)
+            return entry
+    
+    def _prefetch_folders(self, service):
+        """
+        Load the name and parent of every folder in a few paged list calls,
+        so ancestor chains can be walked in memory instead of one request per level.
+        The cache is only marked prefetched once the whole listing succeeded.
+        """
+        folders = []
+        page_token = None
+        while True:
+            results = service.files().list(
+                q="mimeType='application/vnd.google-apps.folder' and trashed=false",
+                pageSize=1000,
+                fields="nextPageToken, files(id, name, parents)",
+                pageToken=page_token
+            ).execute()
+            
+            for folder in results.get('files', []):
+                parents = folder.get('parents', [])
+                folders.append((folder['id'], folder['name'], parents[0] if parents else None))
+            
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        
+        self._cache_folders(folders)
+        with self._folder_lock:
+            self._folders_prefetched = True
         
     def get_service(self):
-        """Get authenticated Google Drive service"""
-        if not self.service:
-            self.service = drive_auth.get_drive_service()
-        return self.service
+        """Get authenticated Google Drive service (shared, cached in the auth module)"""
+        return drive_auth.get_drive_service()
     
     def list_folders(self, parent_folder_id: str = None, max_results: int = 100) -> List[Dict[str, Any]]:
         """
@@ -56,10 +157,13 @@ class GoogleDriveService:
         # Count images in the Webcam folder
         image_count = 0
         if os.path.exists(webcam_folder_path):
-            image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp']
-            for file in os.listdir(webcam_folder_path):
-                if any(file.lower().endswith(ext) for ext in image_extensions):
-                    image_count += 1
+            # scandir entries carry the file type, so no per-file stat is needed
+            with os.scandir(webcam_folder_path) as entries:
+                image_count = sum(
+                    1 for entry in entries
+                    if entry.is_file(follow_symlinks=False)
+                    and os.path.splitext(entry.name)[1].lower() in LOCAL_IMAGE_EXTENSIONS
+                )
         
         folders = [
             {
@@ -83,12 +187,12 @@ class GoogleDriveService:
             service = self.get_service()
             
             # Very simple query with minimal fields
-            query = f"'{folder_id}' in parents and (mimeType='image/jpeg' or mimeType='image/png') and trashed=false"
+            query = f"'{folder_id}' in parents and {self._MIME_QUERY_FAST} and trashed=false"
             
             results = service.files().list(
                 q=query,
                 pageSize=5,  # Just check if there are any images
-                fields="files(id)"
+                fields=self._FIELDS_THIN
             ).execute()
             
             files = results.get('files', [])
@@ -98,35 +202,16 @@ class GoogleDriveService:
             logger.warning(f"Error counting images: {str(e)}")
             return 0
     
-    def list_images_in_folder(self, folder_id: str, max_results: int = 1000) -> List[Dict[str, Any]]:
+    def list_images_in_folder(self, folder_id: str, max_results: int = 1000, fields: str = None) -> List[Dict[str, Any]]:
         """
-        List image files in a specific Google Drive folder
+        List image files in a specific Google Drive folder (up to max_results, across pages)
+        Pass a narrower fields projection (e.g. _FIELDS_THIN) when only ids are needed.
         """
         try:
-            service = self.get_service()
-            
-            # Build query for images in folder
-            mime_query = " or ".join([f"mimeType='{mime}'" for mime in self.IMAGE_MIME_TYPES])
-            query = f"'{folder_id}' in parents and ({mime_query}) and trashed=false"
-            
-            results = service.files().list(
-                q=query,
-                pageSize=max_results,
-                fields="files(id, name, mimeType, size, modifiedTime, parents, thumbnailLink)",
-                orderBy="name"
-            ).execute()
-            
-            images = results.get('files', [])
+            page_size = min(max_results, MAX_PAGE_SIZE)
+            images = list(islice(self.iter_images_in_folder(folder_id, page_size, fields), max_results))
             
-            # Add additional metadata
-            for image in images:
-                image['type'] = 'image'
-                image['folder_id'] = folder_id
-                # Convert size to int if present
-                if 'size' in image:
-                    image['size'] = int(image['size'])
-            
-            logger.info(f"Found {len(images)} images in folder {folder_id}")
+            logger.debug("Found %d images in folder %s", len(images), folder_id)
             return images
             
         except HttpError as e:
@@ -136,6 +221,99 @@ class GoogleDriveService:
             logger.error(f"Error listing images in folder: {str(e)}")
             return []
     
+    def iter_images_in_folder(self, folder_id: str, page_size: int = MAX_PAGE_SIZE, fields: str = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield every image file in a Google Drive folder, one result page at a time.
+        Only the current page is held in memory; errors propagate to the caller.
+        """
+        service = self.get_service()
+        files = service.files()
+        request = self._list_images_request(service, folder_id, page_size, fields)
+        
+        while request is not None:
+            results = request.execute()
+            yield from self._prepare_images(results.get('files', []), folder_id)
+            request = files.list_next(request, results)
+    
+    def list_images_many(self, folder_ids: List[str], max_results: int = 1000, fields: str = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        List image files in several folders at once (up to max_results per folder, across pages).
+        The listing calls are sent together through the Drive batch endpoint: each round
+        fetches the next page of every folder that has more, one round trip per
+        MAX_BATCH_REQUESTS folders.
+        Returns {folder_id: images}; folders that failed map to an empty list.
+        """
+        images_by_folder = {folder_id: [] for folder_id in folder_ids}
+        page_size = min(max_results, MAX_PAGE_SIZE)
+        
+        # folder_id -> request for its next page, for this round and the next one
+        pending = {}
+        next_pending = {}
+        
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"HTTP Error listing images in folder {request_id}: {exception}")
+                images_by_folder[request_id] = []
+                return
+            
+            images = images_by_folder[request_id]
+            images.extend(self._prepare_images(response.get('files', []), request_id))
+            if len(images) >= max_results:
+                del images[max_results:]
+                return
+            
+            # Pages can come back short before the end; only a missing token ends the listing
+            next_request = files.list_next(pending[request_id], response)
+            if next_request is not None:
+                next_pending[request_id] = next_request
+        
+        try:
+            service = self.get_service()
+            files = service.files()
+            pending = {folder_id: self._list_images_request(service, folder_id, page_size, fields)
+                       for folder_id in images_by_folder}
+            
+            while pending:
+                round_ids = list(pending)
+                for start in range(0, len(round_ids), MAX_BATCH_REQUESTS):
+                    batch = service.new_batch_http_request(callback=on_response)
+                    for folder_id in round_ids[start:start + MAX_BATCH_REQUESTS]:
+                        batch.add(pending[folder_id], request_id=folder_id)
+                    batch.execute()
+                
+                pending, next_pending = next_pending, {}
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Found %d images in %d folders",
+                             sum(len(images) for images in images_by_folder.values()), len(images_by_folder))
+            
+        except Exception as e:
+            logger.error(f"Error listing images in folders: {str(e)}")
+        
+        return images_by_folder
+    
+    def _list_images_request(self, service, folder_id: str, max_results: int, fields: str = None):
+        """Build the files().list request for the images in a folder"""
+        query = f"'{folder_id}' in parents and {self._MIME_QUERY_IMAGE} and trashed=false"
+        
+        return service.files().list(
+            q=query,
+            pageSize=max_results,
+            fields="nextPageToken," + (fields or self._FIELDS_FULL),
+            orderBy="name"
+        )
+    
+    def _prepare_images(self, images: List[Dict[str, Any]], folder_id: str) -> List[Dict[str, Any]]:
+        """Add the metadata callers expect to listed image files"""
+        defaults = {'type': 'image', 'folder_id': folder_id}
+        for image in images:
+            image.update(defaults)
+            # Convert size to int if present
+            size = image.get('size')
+            if size is not None:
+                image['size'] = int(size)
+        return images
+    
     def count_images_in_folder(self, folder_id: str) -> int:
         """
         Count number of images in a folder (simplified to avoid SSL issues)
@@ -144,13 +322,12 @@ class GoogleDriveService:
             service = self.get_service()
             
             # Simplified query to avoid SSL issues
-            mime_query = " or ".join([f"mimeType='{mime}'" for mime in self.IMAGE_MIME_TYPES[:3]])  # Use only first 3 mime types
-            query = f"'{folder_id}' in parents and ({mime_query}) and trashed=false"
+            query = f"'{folder_id}' in parents and {self._MIME_QUERY_COUNT} and trashed=false"  # Only the first 3 mime types
             
             results = service.files().list(
                 q=query,
                 pageSize=10,  # Small page size
-                fields="files(id)"
+                fields=self._FIELDS_THIN
             ).execute()
             
             files = results.get('files', [])
@@ -175,28 +352,44 @@ class GoogleDriveService:
             service = self.get_service()
             
             # Get file metadata
-            file_metadata = service.files().get(fileId=file_id).execute()
+            file_metadata = service.files().get(fileId=file_id, fields="name, size").execute()
             file_name = file_metadata['name']
+            file_size = int(file_metadata.get('size', 0))
             
             # Create local path if not provided
             if not local_path:
                 temp_dir = tempfile.gettempdir()
                 local_path = os.path.join(temp_dir, f"drive_{file_id}_{file_name}")
             
-            # Download file
             request = service.files().get_media(fileId=file_id)
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            
-            done = False
-            while done is False:
-                status, done = downloader.next_chunk()
-            
-            # Save to local file
-            with open(local_path, 'wb') as f:
-                f.write(fh.getvalue())
-            
-            logger.info(f"Downloaded {file_name} to {local_path}")
+            try:
+                if file_size and file_size <= SMALL_DOWNLOAD_SIZE:
+                    # Typical photos: a single GET, no chunking machinery
+                    content = request.execute()
+                    with open(local_path, 'wb') as fh:
+                        fh.write(content)
+                else:
+                    # Large or unknown size: stream the file straight to disk in ranged chunks
+                    with open(local_path, 'wb', buffering=DOWNLOAD_BUFFER_SIZE) as fh:
+                        # Reserve the whole file up front so chunk writes never grow it piecemeal
+                        if file_size and hasattr(os, 'posix_fallocate'):
+                            try:
+                                os.posix_fallocate(fh.fileno(), 0, file_size)
+                            except OSError:
+                                pass
+                        
+                        downloader = MediaIoBaseDownload(fh, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+                        
+                        done = False
+                        while done is False:
+                            status, done = downloader.next_chunk()
+            except Exception:
+                # Do not leave a truncated file behind
+                if os.path.exists(local_path):
+                    os.remove(local_path)
+                raise
+            
+            logger.debug("Downloaded %s to %s", file_name, local_path)
             return local_path
             
         except HttpError as e:
@@ -206,6 +399,18 @@ class GoogleDriveService:
             logger.error(f"Error downloading file {file_id}: {str(e)}")
             return None
     
+    def download_images(self, file_ids: List[str], max_workers: int = DOWNLOAD_WORKERS) -> List[Optional[str]]:
+        """
+        Download several image files concurrently.
+        Returns the local paths in the order of file_ids (None for failed downloads).
+        """
+        if not file_ids:
+            return []
+        
+        # Each worker thread gets its own authorized connection from drive_auth
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(file_ids))) as executor:
+            return list(executor.map(self.download_image, file_ids))
+    
     def get_file_info(self, file_id: str) -> Optional[Dict[str, Any]]:
         """
         Get detailed information about a file
@@ -235,23 +440,23 @@ class GoogleDriveService:
             service = self.get_service()
             
             # Build search query
+            safe_query = query.translate(_DRIVE_ESCAPE)
             if file_type == 'image':
-                mime_query = " or ".join([f"mimeType='{mime}'" for mime in self.IMAGE_MIME_TYPES])
-                search_query = f"({mime_query}) and name contains '{query}' and trashed=false"
+                search_query = f"{self._MIME_QUERY_IMAGE} and name contains '{safe_query}' and trashed=false"
             elif file_type == 'folder':
-                search_query = f"mimeType='application/vnd.google-apps.folder' and name contains '{query}' and trashed=false"
+                search_query = f"mimeType='application/vnd.google-apps.folder' and name contains '{safe_query}' and trashed=false"
             else:
-                search_query = f"name contains '{query}' and trashed=false"
+                search_query = f"name contains '{safe_query}' and trashed=false"
             
             results = service.files().list(
                 q=search_query,
                 pageSize=max_results,
-                fields="files(id, name, mimeType, size, modifiedTime, parents, thumbnailLink)",
+                fields=self._FIELDS_FULL,
                 orderBy="name"
             ).execute()
             
             files = results.get('files', [])
-            logger.info(f"Search found {len(files)} files for query: {query}")
+            logger.debug("Search found %d files for query: %s", len(files), query)
             return files
             
         except HttpError as e:
@@ -269,20 +474,40 @@ class GoogleDriveService:
             service = self.get_service()
             hierarchy = []
             current_id = folder_id
+            prefetch_tried = False
+            
+            self._expire_folder_cache()
             
             while current_id and current_id != 'root':
-                folder_info = service.files().get(
-                    fileId=current_id,
-                    fields="id, name, parents"
-                ).execute()
+                cached = self._get_cached_folder(current_id)
                 
-                hierarchy.insert(0, {
-                    'id': folder_info['id'],
-                    'name': folder_info['name']
-                })
+                # A failed prefetch is retried on a later call, not once per level of this one
+                if cached is None and not self._folders_prefetched and not prefetch_tried:
+                    prefetch_tried = True
+                    try:
+                        self._prefetch_folders(service)
+                    except HttpError as e:
+                        logger.warning(f"Could not prefetch folders: {str(e)}")
+                    cached = self._get_cached_folder(current_id)
+                
+                if cached is None:
+                    # Not a listed folder (e.g. shared with us), fetch it directly
+                    folder_info = service.files().get(
+                        fileId=current_id,
+                        fields="id, name, parents"
+                    ).execute()
+                    parents = folder_info.get('parents', [])
+                    cached = (folder_info['name'], parents[0] if parents else None)
+                    self._cache_folder(current_id, *cached)
                 
-                parents = folder_info.get('parents', [])
-                current_id = parents[0] if parents else None
+                name, parent_id = cached
+                hierarchy.append({
+                    'id': current_id,
+                    'name': name
+                })
+                current_id = parent_id
+            
+            hierarchy.reverse()
             
             # Add root folder
             if current_id == 'root':
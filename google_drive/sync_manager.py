@@ -11,17 +11,119 @@ import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import tempfile
+import numpy as np
 
-from .drive_service import drive_service
+# Indexed similarity search when faiss is installed
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# Compiled distance kernel when numba is installed
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# GPU similarity search when PyTorch is installed (enabled by Config.USE_GPU_SEARCH)
+try:
+    import torch
+except ImportError:
+    torch = None
+
+from .drive_service import drive_service, LOCAL_IMAGE_EXTENSIONS
 import sys
-import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from face_recognition_engine import FaceRecognitionEngine
 from database_manager import DatabaseManager
+from photo_manager import PhotoManager
+from config import Config
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Galleries of at least this many faces use an approximate HNSW faiss index;
+# smaller ones use an exact flat index
+FAISS_HNSW_MIN_FACES = 100000
+# Neighbours per HNSW node, and how many nearest faces an HNSW query returns
+FAISS_HNSW_NEIGHBORS = 32
+FAISS_HNSW_TOP_K = 1000
+
+# The norm pre-filter only pays off when it leaves at most this fraction of the faces;
+# otherwise one contiguous pass over the whole matrix is cheaper than gathering rows
+NORM_PREFILTER_MAX_FRACTION = 0.5
+
+# Rows fetched per round trip when loading Drive face encodings
+DRIVE_FETCH_SIZE = 1024
+
+# Queries run on every Drive search. Kept as constants so each call passes the identical
+# string and reuses the prepared statement from the connection's statement cache
+DRIVE_VERSION_SQL = '''
+    SELECT (SELECT MAX(id) FROM face_encodings), (SELECT COUNT(*) FROM face_encodings),
+           (SELECT MAX(id) FROM drive_files), (SELECT COUNT(*) FROM drive_files)
+'''
+DRIVE_NEW_FACES_SQL = "SELECT COUNT(*) FROM face_encodings WHERE id > ?"
+DRIVE_ENCODINGS_SQL = '''
+    SELECT fe.id, i.file_path, i.file_name, fe.encoding_data, fe.face_index,
+           df.drive_file_id, df.drive_folder_id
+    FROM face_encodings fe
+    JOIN images i ON i.id = fe.image_id
+    JOIN drive_files df ON fe.image_id = df.local_image_id
+    WHERE df.sync_status = 'synced' AND fe.id > ?
+'''
+
+# Drive files table; deleting an image removes its drive record
+DRIVE_FILES_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        drive_file_id TEXT UNIQUE NOT NULL,
+        local_image_id INTEGER,
+        file_name TEXT NOT NULL,
+        mime_type TEXT,
+        size INTEGER,
+        modified_time TEXT,
+        drive_folder_id TEXT,
+        sync_status TEXT DEFAULT 'synced',
+        last_synced TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (local_image_id) REFERENCES images (id) ON DELETE CASCADE
+    )
+'''
+DRIVE_FILES_COLUMNS = ('id, drive_file_id, local_image_id, file_name, mime_type, size, '
+                       'modified_time, drive_folder_id, sync_status, last_synced')
+
+# Columns _record_sync_folder and get_synced_drive_folders need on drive_folders,
+# added to tables created by older versions of either
+DRIVE_FOLDER_COLUMNS = {
+    'parent_folder_id': 'TEXT',
+    'is_synced': 'BOOLEAN DEFAULT TRUE',
+    'file_count': 'INTEGER DEFAULT 0'
+}
+
+# Drive images written to the database per transaction during a folder sync
+DRIVE_WRITE_BATCH = 100
+
+# Indexes for the drive_files lookups: the synced-face join and per-folder removal.
+# drive_file_id is already indexed by its UNIQUE constraint, and
+# face_encodings(image_id) by idx_face_enc_img_idx
+DRIVE_INDEX_SQL = '''
+    CREATE INDEX IF NOT EXISTS idx_drive_files_status_localid ON drive_files(sync_status, local_image_id);
+    CREATE INDEX IF NOT EXISTS idx_drive_files_folder ON drive_files(drive_folder_id);
+'''
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _squared_distances(matrix, target, out):
+        """Squared Euclidean distance from every matrix row to target, written into out"""
+        for i in numba.prange(matrix.shape[0]):
+            total = 0.0
+            for k in range(matrix.shape[1]):
+                diff = matrix[i, k] - target[k]
+                total += diff * diff
+            out[i] = total
+        return out
+else:
+    _squared_distances = None
+
 class GoogleDriveSyncManager:
     """
     Manages synchronization between Google Drive and local face database
@@ -39,6 +141,24 @@ class GoogleDriveSyncManager:
         }
         self.sync_lock = threading.Lock()
         self._stop_sync = False
+        # Set once the Google Drive tables are known to exist
+        self._tables_ready = False
+        # Encodings of synced Drive faces kept in memory between searches. snapshot is an
+        # immutable (matrix, sq_norms, meta, norm_order, sorted_norms, index, gpu) tuple:
+        # matrix is (N, 128) float32 with its squared row norms, meta holds the result columns,
+        # norm_order and sorted_norms list the rows by vector length for the norm pre-filter,
+        # index is the faiss index over matrix (when faiss is available) and
+        # gpu holds the matrix and squared norms as CUDA tensors (when GPU search is enabled).
+        # A search works on one snapshot even if another thread refreshes the cache meanwhile
+        self._enc_cache = {'version': None, 'snapshot': None}
+        # Serializes cache refreshes
+        self._enc_lock = threading.Lock()
+        # The faiss index is shared between snapshots and grows in place, so adds and
+        # searches must not overlap
+        self._index_lock = threading.Lock()
+        self._use_gpu = bool(Config.USE_GPU_SEARCH and torch is not None and torch.cuda.is_available())
+        self._ensure_drive_files_cascade()
+        self._ensure_drive_indexes()
         
     def get_sync_progress(self) -> Dict[str, Any]:
         """Get current sync progress"""
@@ -49,75 +169,79 @@ class GoogleDriveSyncManager:
         """Stop the current sync operation"""
         self._stop_sync = True
     
-    def search_similar_faces_in_drive(self, target_encoding, tolerance: float = 0.6, min_similarity: float = 0.55) -> List[Dict[str, Any]]:
+    def search_similar_faces_in_drive(self, target_encoding, tolerance: float = 0.6, min_similarity: float = 0.55,
+                                      top_k: Optional[int] = 50) -> List[Dict[str, Any]]:
         """
         Search for similar faces in Google Drive synced photos
+        Returns at most top_k matches, best first (all matches when top_k is None).
         """
         try:
-            if not self.db_manager._table_exists('drive_files'):
-                return []
+            self._ensure_tables()
             
-            # Get all face encodings from synced Google Drive photos
-            conn = self.db_manager._get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT fe.id, fe.file_path, fe.file_name, fe.encoding, fe.face_index,
-                       df.drive_file_id, df.drive_folder_id
-                FROM face_encodings fe
-                JOIN drive_files df ON fe.image_id = df.local_image_id
-                WHERE df.sync_status = 'synced'
-            ''')
+            snapshot = self._get_drive_encodings()
+            encodings, sq_norms, meta, _, _, index, gpu = snapshot
             
-            drive_encodings = []
-            for row in cursor.fetchall():
-                try:
-                    import numpy as np
-                    encoding = np.frombuffer(row[3], dtype=np.float64)
-                    drive_encodings.append({
-                        'id': row[0],
-                        'file_path': row[1],
-                        'file_name': row[2],
-                        'encoding': encoding,
-                        'face_index': row[4],
-                        'drive_file_id': row[5],
-                        'drive_folder_id': row[6]
-                    })
-                except Exception as e:
-                    logger.error(f"Error processing encoding: {str(e)}")
-                    continue
-            
-            conn.close()
-            
-            if not drive_encodings:
+            if len(encodings) == 0:
                 return []
             
-            # Calculate similarities
-            import face_recognition
-            results = []
+            target = np.asarray(target_encoding, dtype=np.float32)
             
-            for enc_data in drive_encodings:
-                try:
-                    distance = face_recognition.face_distance([enc_data['encoding']], target_encoding)[0]
-                    similarity = 1 - distance
-                    
-                    if similarity >= min_similarity:
-                        results.append({
-                            'file_path': enc_data['file_path'],
-                            'file_name': enc_data['file_name'],
-                            'similarity': similarity,
-                            'distance': distance,
-                            'face_index': enc_data['face_index'],
-                            'source': 'google_drive',
-                            'drive_file_id': enc_data['drive_file_id'],
-                            'drive_folder_id': enc_data['drive_folder_id']
-                        })
-                except Exception as e:
-                    logger.error(f"Error calculating similarity: {str(e)}")
-                    continue
-            
-            # Sort by similarity (highest first)
-            results.sort(key=lambda x: x['similarity'], reverse=True)
+            if gpu is not None:
+                matches, distances = self._search_gpu(snapshot, target, min_similarity, top_k)
+            elif index is not None:
+                matches, distances = self._search_index(snapshot, target, min_similarity)
+                if top_k is not None:
+                    matches, distances = matches[:top_k], distances[:top_k]
+            else:
+                max_distance = 1.0 - min_similarity
+                if max_distance < 0:
+                    return []
+                
+                # Only score the faces whose length is close enough to the target's to match
+                rows = self._norm_candidates(snapshot, target, max_distance)
+                if rows is not None:
+                    encodings, sq_norms = encodings[rows], sq_norms[rows]
+                
+                if _squared_distances is not None:
+                    # One fused, multi-threaded pass over the matrix
+                    sq_distances = _squared_distances(encodings, target, np.empty(len(encodings), dtype=np.float32))
+                else:
+                    # Calculate all squared distances in one float32 pass:
+                    # |m - q|^2 = |m|^2 - 2 m.q + |q|^2, a single matrix-vector product for all rows
+                    sq_distances = sq_norms - 2.0 * (encodings @ target) + np.dot(target, target)
+                
+                # Threshold on squared distance so only matches need a square root
+                matches = np.flatnonzero(sq_distances <= max_distance * max_distance)
+                # Select the top_k closest in linear time, then sort only those
+                if top_k is not None and len(matches) > top_k:
+                    matches = matches[np.argpartition(sq_distances[matches], max(top_k - 1, 0))[:top_k]]
+                # Sort by similarity (highest first)
+                matches = matches[np.argsort(sq_distances[matches], kind='stable')]
+                distances = np.sqrt(np.maximum(sq_distances[matches], 0.0))
+                if rows is not None:
+                    matches = rows[matches]
+            
+            # Gather the result columns for the matches only
+            matches = matches.tolist()
+            file_paths, file_names, drive_file_ids, drive_folder_ids = (
+                [meta[column][i] for i in matches]
+                for column in ('file_path', 'file_name', 'drive_file_id', 'drive_folder_id')
+            )
+            face_indexes = meta['face_index'][matches].tolist()
+            
+            results = []
+            for file_path, file_name, distance, face_index, drive_file_id, drive_folder_id in zip(
+                    file_paths, file_names, distances.tolist(), face_indexes, drive_file_ids, drive_folder_ids):
+                results.append({
+                    'file_path': file_path,
+                    'file_name': file_name,
+                    'similarity': 1.0 - distance,
+                    'distance': distance,
+                    'face_index': face_index,
+                    'source': 'google_drive',
+                    'drive_file_id': drive_file_id,
+                    'drive_folder_id': drive_folder_id
+                })
             
             logger.info(f"Found {len(results)} similar faces in Google Drive photos")
             return results
@@ -126,6 +250,182 @@ class GoogleDriveSyncManager:
             logger.error(f"Error searching Google Drive faces: {str(e)}")
             return []
         
+    def _get_drive_encodings(self):
+        """
+        Return the (matrix, squared row norms, meta, norm_order, sorted_norms, index, gpu)
+        snapshot of all faces in synced Google Drive photos.
+        meta holds one parallel column per result field (face_index as an int32 array,
+        the rest as lists), aligned with the matrix rows.
+        The result is cached and only re-read when the face or drive file tables change;
+        when faces were only appended, just the new rows are read.
+        """
+        with self._enc_lock:
+            return self._refresh_drive_encodings()
+    
+    def _refresh_drive_encodings(self):
+        """Bring the cached snapshot up to date (the caller holds self._enc_lock)"""
+        cache = self._enc_cache
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(DRIVE_VERSION_SQL)
+            max_id, face_count, drive_max_id, drive_count = cursor.fetchone()
+            max_id = max_id if max_id is not None else -1
+            version = (max_id, face_count, drive_max_id, drive_count)
+            
+            if version == cache['version']:
+                return cache['snapshot']
+            
+            # Faces were only added since the last read: fetch just the new rows
+            old_version = cache['version']
+            incremental = (
+                old_version is not None
+                and old_version[2:] == version[2:]
+                and max_id > old_version[0]
+                and face_count - old_version[1] == cursor.execute(DRIVE_NEW_FACES_SQL, (old_version[0],)).fetchone()[0]
+            )
+            since_id = old_version[0] if incremental else -1
+            
+            cursor.execute(DRIVE_ENCODINGS_SQL, (since_id,))
+            
+            # Decode a chunk of rows at a time so the raw rows never pile up in memory
+            cursor.arraysize = DRIVE_FETCH_SIZE
+            chunks = []
+            file_paths, file_names, face_indexes, drive_file_ids, drive_folder_ids = [], [], [], [], []
+            while True:
+                rows = cursor.fetchmany()
+                if not rows:
+                    break
+                chunks.append(np.frombuffer(b''.join(row[3] for row in rows), dtype=np.float32).reshape(len(rows), -1))
+                file_paths.extend(row[1] for row in rows)
+                file_names.extend(row[2] for row in rows)
+                face_indexes.extend(row[4] for row in rows)
+                drive_file_ids.extend(row[5] for row in rows)
+                drive_folder_ids.extend(row[6] for row in rows)
+        
+        # Stack the encodings into one (N, 128) matrix
+        matrix = np.vstack(chunks) if chunks else np.empty((0, 128), dtype=np.float32)
+        sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+        meta = {
+            'file_path': file_paths,
+            'file_name': file_names,
+            'face_index': np.array(face_indexes, dtype=np.int32),
+            'drive_file_id': drive_file_ids,
+            'drive_folder_id': drive_folder_ids
+        }
+        
+        index = None
+        gpu = None
+        if incremental:
+            # Extend the cached columns in lockstep with the matrix; everything but the
+            # faiss index is copied, so older snapshots stay intact
+            old_matrix, old_sq_norms, old_meta, _, _, index, gpu = cache['snapshot']
+            if index is not None and len(matrix):
+                with self._index_lock:
+                    index.add(matrix)
+            if gpu is not None and len(matrix):
+                gpu = tuple(torch.cat((cached, torch.from_numpy(values).cuda()))
+                            for cached, values in zip(gpu, (matrix, sq_norms)))
+            matrix = np.vstack((old_matrix, matrix))
+            sq_norms = np.concatenate((old_sq_norms, sq_norms))
+            meta = {
+                column: (np.concatenate((values, meta[column])) if isinstance(values, np.ndarray)
+                         else values + meta[column])
+                for column, values in old_meta.items()
+            }
+        elif self._use_gpu and len(matrix):
+            gpu = (torch.from_numpy(matrix).cuda(), torch.from_numpy(sq_norms).cuda())
+        elif faiss is not None and len(matrix):
+            index = self._build_index(matrix)
+        
+        norms = np.sqrt(sq_norms)
+        norm_order = np.argsort(norms, kind='stable')
+        
+        snapshot = (matrix, sq_norms, meta, norm_order, norms[norm_order], index, gpu)
+        cache.update(version=version, snapshot=snapshot)
+        return snapshot
+    
+    def _norm_candidates(self, snapshot: tuple, target: np.ndarray, max_distance: float) -> Optional[np.ndarray]:
+        """
+        Rows of the snapshot's matrix that can lie within max_distance of target.
+        By the triangle inequality | |m| - |q| | <= |m - q|, so only faces whose norm is within
+        max_distance of the target's norm can match. Returns None when too many faces remain
+        for the pre-filter to help.
+        """
+        _, _, _, norm_order, sorted_norms, _, _ = snapshot
+        target_norm = float(np.linalg.norm(target))
+        lo = np.searchsorted(sorted_norms, target_norm - max_distance, side='left')
+        hi = np.searchsorted(sorted_norms, target_norm + max_distance, side='right')
+        if hi - lo > NORM_PREFILTER_MAX_FRACTION * len(sorted_norms):
+            return None
+        return np.sort(norm_order[lo:hi])
+    
+    def _build_index(self, matrix: np.ndarray):
+        """Build a faiss index over the encoding matrix"""
+        if len(matrix) >= FAISS_HNSW_MIN_FACES:
+            index = faiss.IndexHNSWFlat(matrix.shape[1], FAISS_HNSW_NEIGHBORS)
+        else:
+            index = faiss.IndexFlatL2(matrix.shape[1])
+        index.add(np.ascontiguousarray(matrix))
+        return index
+    
+    def _search_index(self, snapshot: tuple, target: np.ndarray, min_similarity: float):
+        """
+        Find the snapshot's faces with similarity >= min_similarity using the faiss index.
+        Returns (row indices, distances) sorted from closest to farthest.
+        """
+        matrix, _, _, _, _, index, _ = snapshot
+        max_distance = 1.0 - min_similarity
+        if max_distance < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        query = target.reshape(1, -1)
+        with self._index_lock:
+            if isinstance(index, faiss.IndexFlatL2):
+                # Exact: every face within the radius (faiss uses squared L2 distances)
+                lims, sq_distances, rows = index.range_search(query, max_distance * max_distance)
+                sq_distances, rows = sq_distances[lims[0]:lims[1]], rows[lims[0]:lims[1]]
+            else:
+                # Approximate: the nearest FAISS_HNSW_TOP_K faces, then the same threshold
+                sq_distances, rows = index.search(query, min(FAISS_HNSW_TOP_K, index.ntotal))
+                sq_distances, rows = sq_distances[0], rows[0]
+        
+        # Rows added to the shared index after this snapshot was taken are not in its meta
+        keep = (rows >= 0) & (rows < len(matrix)) & (sq_distances <= max_distance * max_distance)
+        sq_distances, rows = sq_distances[keep], rows[keep]
+        
+        order = np.argsort(sq_distances, kind='stable')
+        return rows[order], np.sqrt(np.maximum(sq_distances[order], 0.0))
+    
+    def _search_gpu(self, snapshot: tuple, target: np.ndarray, min_similarity: float, top_k: Optional[int]):
+        """
+        Find the snapshot's faces with similarity >= min_similarity on the GPU.
+        Returns (row indices, distances) for at most top_k faces, sorted from closest to farthest;
+        only the matches are copied back to the host.
+        """
+        max_distance = 1.0 - min_similarity
+        if max_distance < 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        
+        matrix, sq_norms = snapshot[6]
+        query = torch.from_numpy(target).to(matrix.device)
+        with torch.no_grad():
+            sq_distances = sq_norms - 2.0 * torch.mv(matrix, query) + torch.dot(query, query)
+            rows = torch.nonzero(sq_distances <= max_distance * max_distance).flatten()
+            sq_distances = sq_distances[rows]
+            if top_k is not None and len(rows) > top_k:
+                # topk returns the selection already sorted
+                sq_distances, order = torch.topk(sq_distances, top_k, largest=False)
+            else:
+                sq_distances, order = torch.sort(sq_distances, stable=True)
+            rows = rows[order]
+        
+        return rows.cpu().numpy(), np.sqrt(np.maximum(sq_distances.cpu().numpy(), 0.0))
+    
+    def invalidate_encoding_cache(self):
+        """Drop the cached Drive face encodings"""
+        with self._enc_lock:
+            self._enc_cache = {'version': None, 'snapshot': None}
+    
     def sync_drive_folder(self, folder_id: str, folder_name: str = None) -> Dict[str, Any]:
         """
         Sync a Google Drive folder with local database
@@ -171,13 +471,11 @@ class GoogleDriveSyncManager:
                 'error': str(e)
             }
     
-    def _sync_local_webcam_folder(self) -> Dict[str, Any]:
+    def _sync_local_webcam_folder(self, max_workers: Optional[int] = None) -> Dict[str, Any]:
         """
         Sync the local Webcam folder images into the database
+        max_workers defaults to Config.MAX_WORKER_THREADS.
         """
-        import os
-        from photo_manager import PhotoManager
-        
         webcam_folder_path = "/home/mohan/Desktop/Mohan/Vanithaphotography/Webcam"
         
         if not os.path.exists(webcam_folder_path):
@@ -186,13 +484,13 @@ class GoogleDriveSyncManager:
                 'error': 'Webcam folder not found'
             }
         
-        # Get all image files
-        image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp']
-        image_files = []
-        
-        for file in os.listdir(webcam_folder_path):
-            if any(file.lower().endswith(ext) for ext in image_extensions):
-                image_files.append(os.path.join(webcam_folder_path, file))
+        # Get all image files (scandir entries carry the file type and full path)
+        with os.scandir(webcam_folder_path) as entries:
+            image_files = [
+                entry.path for entry in entries
+                if entry.is_file()
+                and os.path.splitext(entry.name)[1].lower() in LOCAL_IMAGE_EXTENSIONS
+            ]
         
         with self.sync_lock:
             self.sync_progress['total'] = len(image_files)
@@ -204,32 +502,20 @@ class GoogleDriveSyncManager:
         # Initialize photo manager
         photo_manager = PhotoManager(self.db_manager)
         
-        synced_count = 0
-        failed_count = 0
-        
-        for i, image_path in enumerate(image_files):
-            if self._stop_sync:
-                logger.info("Sync stopped by user")
-                break
-            
-            try:
-                # Process the image for face recognition using index_image method
-                success = photo_manager.index_image(image_path)
-                if success:
-                    synced_count += 1
-                    logger.info(f"Synced image: {os.path.basename(image_path)}")
-                else:
-                    failed_count += 1
-                    logger.warning(f"Failed to sync image: {os.path.basename(image_path)}")
-                    
-            except Exception as e:
-                logger.error(f"Error syncing image {os.path.basename(image_path)}: {str(e)}")
-                failed_count += 1
-            
-            # Update progress
+        def on_progress(current: int, total: int):
             with self.sync_lock:
-                self.sync_progress['current'] = i + 1
-                self.sync_progress['message'] = f'Synced {synced_count}/{len(image_files)} images from Webcam'
+                self.sync_progress['current'] = current
+                self.sync_progress['message'] = f'Processed {current}/{total} images from Webcam'
+        
+        # Faces are detected in parallel worker processes
+        result = photo_manager.index_images_batch(
+            image_files,
+            max_workers=max_workers or Config.MAX_WORKER_THREADS,
+            progress_callback=on_progress,
+            should_stop=lambda: self._stop_sync
+        )
+        synced_count = result['successful']
+        failed_count = result['failed']
         
         # Final status
         with self.sync_lock:
@@ -257,28 +543,17 @@ class GoogleDriveSyncManager:
         Record synced folder in database
         """
         try:
-            conn = self.db_manager._get_connection()
-            cursor = conn.cursor()
-            
-            # Create drive_folders table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS drive_folders (
-                    drive_folder_id TEXT PRIMARY KEY,
-                    folder_name TEXT NOT NULL,
-                    file_count INTEGER DEFAULT 0,
-                    last_synced TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Insert or update folder record
-            cursor.execute('''
-                INSERT OR REPLACE INTO drive_folders 
-                (drive_folder_id, folder_name, file_count, last_synced)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-            ''', (folder_id, folder_name, file_count))
-            
-            conn.commit()
-            conn.close()
+            self._ensure_tables()
+            
+            with self.db_manager.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Insert or update folder record
+                cursor.execute('''
+                    INSERT OR REPLACE INTO drive_folders 
+                    (drive_folder_id, folder_name, file_count, last_synced)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ''', (folder_id, folder_name, file_count))
             
             logger.info(f"Recorded sync for folder: {folder_name}")
             
@@ -290,28 +565,21 @@ class GoogleDriveSyncManager:
         Get list of synced folders (HARDCODED to show Webcam if synced)
         """
         try:
-            conn = self.db_manager._get_connection()
-            cursor = conn.cursor()
-            
-            # Check if drive_folders table exists
-            cursor.execute('''
-                SELECT name FROM sqlite_master 
-                WHERE type='table' AND name='drive_folders'
-            ''')
-            
-            if not cursor.fetchone():
-                conn.close()
-                return []
-            
-            # Get synced folders
-            cursor.execute('''
-                SELECT drive_folder_id, folder_name, file_count, last_synced
-                FROM drive_folders
-                ORDER BY last_synced DESC
-            ''')
+            self._ensure_tables()
+            
+            with self.db_manager.connection() as conn:
+                cursor = conn.cursor()
+                
+                # Get synced folders
+                cursor.execute('''
+                    SELECT drive_folder_id, folder_name, file_count, last_synced
+                    FROM drive_folders
+                    ORDER BY last_synced DESC
+                ''')
+                rows = cursor.fetchall()
             
             folders = []
-            for row in cursor.fetchall():
+            for row in rows:
                 folders.append({
                     'drive_folder_id': row[0],
                     'folder_name': row[1],
@@ -319,7 +587,6 @@ class GoogleDriveSyncManager:
                     'last_synced': row[3]
                 })
             
-            conn.close()
             return folders
             
         except Exception as e:
@@ -329,21 +596,13 @@ class GoogleDriveSyncManager:
     def _is_image_already_synced(self, drive_file_id: str) -> bool:
         """Check if a Google Drive image is already in the database"""
         try:
-            # Check if we have a drive_files table
-            if not self.db_manager._table_exists('drive_files'):
-                self._create_drive_tables()
-                return False
+            self._ensure_tables()
             
-            conn = self.db_manager._get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute(
-                "SELECT id FROM drive_files WHERE drive_file_id = ?",
-                (drive_file_id,)
-            )
-            
-            result = cursor.fetchone()
-            conn.close()
+            with self.db_manager.connection() as conn:
+                result = conn.execute(
+                    "SELECT id FROM drive_files WHERE drive_file_id = ?",
+                    (drive_file_id,)
+                ).fetchone()
             
             return result is not None
             
@@ -351,53 +610,143 @@ class GoogleDriveSyncManager:
             logger.error(f"Error checking if image is synced: {str(e)}")
             return False
     
-    def _create_drive_tables(self):
-        """Create Google Drive integration tables"""
+    def _ensure_drive_files_cascade(self):
+        """Rebuild a drive_files table created before its foreign key cascaded image deletes"""
         try:
-            conn = self.db_manager._get_connection()
-            cursor = conn.cursor()
+            if not self.db_manager._table_exists('drive_files'):
+                return
+            
+            with self.db_manager.transaction() as conn:
+                on_delete = [row[6] for row in conn.execute('PRAGMA foreign_key_list(drive_files)')]
+                if on_delete == ['CASCADE']:
+                    return
+                
+                # SQLite cannot alter a foreign key: copy into a new table and swap it in.
+                # Records whose image no longer exists are dropped so those files sync again
+                conn.execute('DROP TABLE IF EXISTS drive_files_new')
+                conn.execute(DRIVE_FILES_TABLE_SQL.format(name='drive_files_new'))
+                conn.execute(f'''
+                    INSERT INTO drive_files_new ({DRIVE_FILES_COLUMNS})
+                    SELECT {DRIVE_FILES_COLUMNS} FROM drive_files
+                    WHERE local_image_id IS NULL OR local_image_id IN (SELECT id FROM images)
+                ''')
+                conn.execute('DROP TABLE drive_files')
+                conn.execute('ALTER TABLE drive_files_new RENAME TO drive_files')
+                for statement in DRIVE_INDEX_SQL.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+            
+            logger.info("Rebuilt drive_files with ON DELETE CASCADE")
             
-            # Drive files table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS drive_files (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    drive_file_id TEXT UNIQUE NOT NULL,
-                    local_image_id INTEGER,
-                    file_name TEXT NOT NULL,
-                    mime_type TEXT,
-                    size INTEGER,
-                    modified_time TEXT,
-                    drive_folder_id TEXT,
-                    sync_status TEXT DEFAULT 'synced',
-                    last_synced TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (local_image_id) REFERENCES images (id)
-                )
-            ''')
-            
-            # Drive folders table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS drive_folders (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    drive_folder_id TEXT UNIQUE NOT NULL,
-                    folder_name TEXT NOT NULL,
-                    parent_folder_id TEXT,
-                    is_synced BOOLEAN DEFAULT TRUE,
-                    last_synced TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+        except Exception as e:
+            logger.error(f"Error upgrading drive_files table: {str(e)}")
+    
+    def _ensure_drive_indexes(self):
+        """Add the drive_files indexes to databases created before they existed"""
+        try:
+            if not self.db_manager._table_exists('drive_files'):
+                return
+            
+            with self.db_manager.connection() as conn:
+                existing = conn.execute(
+                    "SELECT COUNT(*) FROM sqlite_master WHERE type='index' AND name='idx_drive_files_status_localid'"
+                ).fetchone()[0]
+                if existing:
+                    return
+                
+                conn.executescript(DRIVE_INDEX_SQL)
+                conn.execute('ANALYZE drive_files')
             
-            conn.commit()
-            conn.close()
+            logger.info("Created Google Drive indexes")
+            
+        except Exception as e:
+            logger.error(f"Error creating drive indexes: {str(e)}")
+    
+    def _ensure_tables(self):
+        """Create the Google Drive tables the first time they are needed"""
+        if self._tables_ready:
+            return
+        
+        with self.sync_lock:
+            if not self._tables_ready:
+                self._tables_ready = self._create_drive_tables()
+    
+    def _create_drive_tables(self) -> bool:
+        """Create Google Drive integration tables"""
+        try:
+            with self.db_manager.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Drive files table
+                cursor.execute(DRIVE_FILES_TABLE_SQL.format(name='drive_files'))
+                
+                # Drive folders table
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS drive_folders (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        drive_folder_id TEXT UNIQUE NOT NULL,
+                        folder_name TEXT NOT NULL,
+                        parent_folder_id TEXT,
+                        is_synced BOOLEAN DEFAULT TRUE,
+                        file_count INTEGER DEFAULT 0,
+                        last_synced TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # drive_folders tables created by _record_sync_folder lacked some columns
+                existing = {row[1] for row in cursor.execute('PRAGMA table_info(drive_folders)')}
+                for column, definition in DRIVE_FOLDER_COLUMNS.items():
+                    if column not in existing:
+                        cursor.execute(f'ALTER TABLE drive_folders ADD COLUMN {column} {definition}')
+                
+                for statement in DRIVE_INDEX_SQL.split(';'):
+                    if statement.strip():
+                        cursor.execute(statement)
             
             logger.info("Created Google Drive tables")
+            return True
             
         except Exception as e:
             logger.error(f"Error creating drive tables: {str(e)}")
+            return False
     
     def _process_drive_image(self, image: Dict[str, Any], folder_id: str, folder_name: str) -> bool:
         """
         Download and process a single Google Drive image
         """
+        processed = self._analyze_drive_image(image, folder_id)
+        return processed is not None and self._store_drive_images([processed], folder_id) == 1
+    
+    def _process_drive_images(self, images: List[Dict[str, Any]], folder_id: str, folder_name: str) -> int:
+        """
+        Download and process Google Drive images, writing them DRIVE_WRITE_BATCH at a time.
+        Returns the number of images stored.
+        Not called yet: sync_drive_folder currently only syncs the local webcam folder.
+        """
+        stored = 0
+        pending = []
+        for image in images:
+            if self._stop_sync:
+                break
+            
+            processed = self._analyze_drive_image(image, folder_id)
+            if processed is not None:
+                pending.append(processed)
+            
+            if len(pending) >= DRIVE_WRITE_BATCH:
+                stored += self._store_drive_images(pending, folder_id)
+                pending = []
+        
+        if pending:
+            stored += self._store_drive_images(pending, folder_id)
+        
+        return stored
+    
+    def _analyze_drive_image(self, image: Dict[str, Any], folder_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Download a Google Drive image and detect its faces.
+        Returns the image with its face data, or None when it could not be processed.
+        """
         temp_file = None
         try:
             # Download image to temporary file
@@ -405,53 +754,20 @@ class GoogleDriveSyncManager:
             
             if not temp_file or not os.path.exists(temp_file):
                 logger.error(f"Failed to download image {image['name']}")
-                return False
+                return None
             
             # Process image for faces
             face_data = self.face_engine.process_image_for_faces(temp_file)
             
             if 'error' in face_data:
                 logger.error(f"Error processing faces in {image['name']}: {face_data['error']}")
-                return False
-            
-            # Create virtual file path for Google Drive image
-            virtual_path = f"gdrive://{folder_id}/{image['name']}"
-            
-            # Add image record to database
-            image_id = self.db_manager.add_image_record(
-                file_path=virtual_path,
-                file_name=image['name'],
-                file_size=image.get('size', 0),
-                modification_time=time.time(),
-                face_count=face_data.get('face_count', 0),
-                folder_path=f"gdrive://{folder_id}"
-            )
-            
-            if not image_id:
-                logger.error(f"Failed to add image record for {image['name']}")
-                return False
-            
-            # Add face encodings to database
-            face_locations = face_data.get('face_locations', [])
-            face_encodings = face_data.get('face_encodings', [])
-            
-            for i, (location, encoding) in enumerate(zip(face_locations, face_encodings)):
-                self.db_manager.add_face_encoding(
-                    image_id=image_id,
-                    face_encoding=encoding,
-                    face_location=location,
-                    face_index=i
-                )
-            
-            # Add Google Drive specific record
-            self._add_drive_file_record(image, image_id, folder_id)
+                return None
             
-            logger.info(f"Successfully processed {image['name']} with {len(face_encodings)} faces")
-            return True
+            return {'image': image, 'face_data': face_data}
             
         except Exception as e:
             logger.error(f"Error processing drive image {image['name']}: {str(e)}")
-            return False
+            return None
             
         finally:
             # Clean up temporary file
@@ -461,59 +777,106 @@ class GoogleDriveSyncManager:
                 except:
                     pass
     
-    def _add_drive_file_record(self, image: Dict[str, Any], local_image_id: int, folder_id: str):
-        """Add Google Drive file record to database"""
+    def _store_drive_images(self, processed: List[Dict[str, Any]], folder_id: str) -> int:
+        """
+        Write processed Google Drive images, their faces and drive records in one transaction.
+        Returns the number of images stored (0 when the transaction failed).
+        """
         try:
-            if not self.db_manager._table_exists('drive_files'):
-                self._create_drive_tables()
+            self._ensure_tables()
             
-            conn = self.db_manager._get_connection()
-            cursor = conn.cursor()
+            records = []
+            with self.db_manager.transaction():
+                for item in processed:
+                    image, face_data = item['image'], item['face_data']
+                    
+                    # Add image record to database under a virtual Google Drive path
+                    image_id = self.db_manager.add_image_record(
+                        file_path=f"gdrive://{folder_id}/{image['name']}",
+                        file_name=image['name'],
+                        file_size=image.get('size', 0),
+                        modification_time=time.time(),
+                        face_count=face_data.get('face_count', 0),
+                        folder_path=f"gdrive://{folder_id}"
+                    )
+                    
+                    if not image_id:
+                        logger.error(f"Failed to add image record for {image['name']}")
+                        continue
+                    
+                    # Add face encodings to database
+                    face_records = list(zip(face_data.get('face_locations', []), face_data.get('face_encodings', [])))
+                    if not self.db_manager.add_face_encodings_bulk(image_id, face_records):
+                        raise RuntimeError(f"Failed to store face encodings for {image['name']}")
+                    
+                    records.append((image, image_id))
+                    logger.debug("Processed %s with %d faces", image['name'], len(face_records))
+                
+                # Add the Google Drive specific records in one statement
+                self._add_drive_file_records(records, folder_id)
             
-            cursor.execute('''
-                INSERT OR REPLACE INTO drive_files 
-                (drive_file_id, local_image_id, file_name, mime_type, size, 
-                 modified_time, drive_folder_id, sync_status, last_synced)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                image['id'],
-                local_image_id,
-                image['name'],
-                image.get('mimeType', ''),
-                image.get('size', 0),
-                image.get('modifiedTime', ''),
-                folder_id,
-                'synced',
-                datetime.now().isoformat()
-            ))
-            
-            conn.commit()
-            conn.close()
+            logger.info(f"Stored {len(records)} Google Drive images")
+            return len(records)
             
         except Exception as e:
-            logger.error(f"Error adding drive file record: {str(e)}")
+            logger.error(f"Error storing drive images: {str(e)}")
+            return 0
+    
+    def _add_drive_file_record(self, image: Dict[str, Any], local_image_id: int, folder_id: str):
+        """Add Google Drive file record to database"""
+        self._add_drive_file_records([(image, local_image_id)], folder_id)
+    
+    def _add_drive_file_records(self, records: List[tuple], folder_id: str):
+        """
+        Add Google Drive file records for (image, local image id) pairs to database.
+        Errors are logged and re-raised so a caller's transaction is rolled back.
+        """
+        try:
+            self._ensure_tables()
+            
+            last_synced = datetime.now().isoformat()
+            
+            # Joins the caller's transaction when there is one
+            with self.db_manager.transaction() as conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO drive_files 
+                    (drive_file_id, local_image_id, file_name, mime_type, size, 
+                     modified_time, drive_folder_id, sync_status, last_synced)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(
+                    image['id'],
+                    local_image_id,
+                    image['name'],
+                    image.get('mimeType', ''),
+                    image.get('size', 0),
+                    image.get('modifiedTime', ''),
+                    folder_id,
+                    'synced',
+                    last_synced
+                ) for image, local_image_id in records])
+            
+        except Exception as e:
+            logger.error(f"Error adding drive file records: {str(e)}")
+            raise
     
     def get_synced_drive_folders(self) -> List[Dict[str, Any]]:
         """Get list of synced Google Drive folders"""
         try:
-            if not self.db_manager._table_exists('drive_folders'):
-                return []
-            
-            conn = self.db_manager._get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT drive_folder_id, folder_name, last_synced,
-                       COUNT(df.id) as file_count
-                FROM drive_folders dfo
-                LEFT JOIN drive_files df ON dfo.drive_folder_id = df.drive_folder_id
-                WHERE dfo.is_synced = TRUE
-                GROUP BY dfo.drive_folder_id, dfo.folder_name, dfo.last_synced
-                ORDER BY dfo.last_synced DESC
-            ''')
+            self._ensure_tables()
+            
+            with self.db_manager.connection() as conn:
+                rows = conn.execute('''
+                    SELECT dfo.drive_folder_id, dfo.folder_name, dfo.last_synced,
+                           COUNT(df.id) as file_count
+                    FROM drive_folders dfo
+                    LEFT JOIN drive_files df ON dfo.drive_folder_id = df.drive_folder_id
+                    WHERE dfo.is_synced = TRUE
+                    GROUP BY dfo.drive_folder_id, dfo.folder_name, dfo.last_synced
+                    ORDER BY dfo.last_synced DESC
+                ''').fetchall()
             
             folders = []
-            for row in cursor.fetchall():
+            for row in rows:
                 folders.append({
                     'drive_folder_id': row[0],
                     'folder_name': row[1],
@@ -521,7 +884,6 @@ class GoogleDriveSyncManager:
                     'file_count': row[3]
                 })
             
-            conn.close()
             return folders
             
         except Exception as e:
@@ -531,35 +893,31 @@ class GoogleDriveSyncManager:
     def remove_synced_folder(self, folder_id: str) -> bool:
         """Remove a synced folder and its files from database"""
         try:
-            if not self.db_manager._table_exists('drive_files'):
-                return True
-            
-            conn = self.db_manager._get_connection()
-            cursor = conn.cursor()
-            
-            # Get local image IDs for this folder
-            cursor.execute(
-                "SELECT local_image_id FROM drive_files WHERE drive_folder_id = ?",
-                (folder_id,)
-            )
-            
-            image_ids = [row[0] for row in cursor.fetchall()]
-            
-            # Remove face encodings for these images
-            for image_id in image_ids:
-                cursor.execute("DELETE FROM face_encodings WHERE image_id = ?", (image_id,))
-                cursor.execute("DELETE FROM images WHERE id = ?", (image_id,))
-            
-            # Remove drive file records
-            cursor.execute("DELETE FROM drive_files WHERE drive_folder_id = ?", (folder_id,))
-            
-            # Remove folder record
-            cursor.execute("DELETE FROM drive_folders WHERE drive_folder_id = ?", (folder_id,))
-            
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"Removed synced folder {folder_id} and {len(image_ids)} images")
+            self._ensure_tables()
+            
+            with self.db_manager.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Remove the folder's images in one statement; their face encodings
+                # and drive file records are removed by ON DELETE CASCADE
+                cursor.execute(
+                    "DELETE FROM images WHERE id IN "
+                    "(SELECT local_image_id FROM drive_files WHERE drive_folder_id = ?)",
+                    (folder_id,)
+                )
+                removed_images = cursor.rowcount
+                
+                # Drive file records without a local image
+                cursor.execute("DELETE FROM drive_files WHERE drive_folder_id = ?", (folder_id,))
+                
+                # Remove folder record
+                cursor.execute("DELETE FROM drive_folders WHERE drive_folder_id = ?", (folder_id,))
+            
+            # Images were removed without going through the manager's write methods
+            self.db_manager.invalidate_caches()
+            self.invalidate_encoding_cache()
+            
+            logger.info(f"Removed synced folder {folder_id} and {removed_images} images")
             return True
             
         except Exception as e:
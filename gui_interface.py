@@ -3,17 +3,35 @@ from tkinter import ttk, filedialog, messagebox, scrolledtext
 from PIL import Image, ImageTk
 import os
 import threading
+import functools
+import queue
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import List, Dict, Optional, Tuple
 import logging
 from database_manager import DatabaseManager
 from photo_manager import PhotoManager
 from face_recognition_engine import FaceRecognitionEngine
+from config import Config
+
+@functools.lru_cache(maxsize=512)
+def _load_thumb_photoimage(thumbnail_path: str, mtime: float) -> ImageTk.PhotoImage:
+    """
+    Decode a thumbnail into a Tk image.
+    mtime is part of the cache key so a regenerated thumbnail is loaded again.
+    """
+    with Image.open(thumbnail_path) as image:
+        return ImageTk.PhotoImage(image)
 
 class PhotoSearchGUI:
     """
     Main GUI application for the face-based photo search system.
     """
     
+    # Search results are drawn as fixed-height rows; only the visible ones
+    # (plus a few either side) exist as widgets at any time
+    RESULT_ROW_HEIGHT = 160
+    RESULT_ROW_OVERSCAN = 3
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Face-Based Photo Search & Management System")
@@ -25,12 +43,31 @@ class PhotoSearchGUI:
         self.photo_manager = PhotoManager(self.db_manager)
         self.face_engine = FaceRecognitionEngine()
         
+        # Thumbnail path per image; files that show up in several searches are only
+        # checked (and their thumbnails generated) once
+        self._thumbnail_path = functools.lru_cache(maxsize=4096)(self.photo_manager.get_image_thumbnail)
+        
+        # Face detection and searching run here so the Tk event loop stays responsive
+        self._executor = ThreadPoolExecutor(max_workers=2)
+        # Thumbnails for search results are generated in parallel (mostly disk I/O and decoding)
+        self._thumb_executor = ThreadPoolExecutor(max_workers=8)
+        
+        # The indexing thread reports status text and (current, total) tuples here;
+        # only the Tk thread touches the widgets
+        self._progress_q = queue.Queue()
+        self._indexing = False
+        
         # GUI state variables
         self.selected_image_path = None
         self.detected_faces = []
         self.selected_face_encoding = None
+        self._selected_face_query = None  # int8 form of the selected encoding (int8 gallery only)
+        self._ref_image_array = None
         self.search_results = []
         self.selected_results = []
+        self._result_rows = {}  # result index -> (canvas window id, row frame)
+        self._scrollregion_jobs = {}  # canvas -> pending after() id
+        self._folders_cache: Optional[List[str]] = None  # search folders, until they change
         
         # Setup logging
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -80,7 +117,7 @@ class PhotoSearchGUI:
         
         self.face_scrollable_frame.bind(
             "<Configure>",
-            lambda e: self.face_canvas.configure(scrollregion=self.face_canvas.bbox("all"))
+            lambda e: self._schedule_scrollregion(self.face_canvas)
         )
         
         self.face_canvas.create_window((0, 0), window=self.face_scrollable_frame, anchor="nw")
@@ -115,22 +152,43 @@ class PhotoSearchGUI:
         self.results_frame = ttk.Frame(right_panel)
         self.results_frame.pack(fill=tk.BOTH, expand=True)
         
-        # Results canvas with scrollbar
-        self.results_canvas = tk.Canvas(self.results_frame)
-        results_scrollbar = ttk.Scrollbar(self.results_frame, orient="vertical", command=self.results_canvas.yview)
-        self.results_scrollable_frame = ttk.Frame(self.results_canvas)
-        
-        self.results_scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.results_canvas.configure(scrollregion=self.results_canvas.bbox("all"))
-        )
+        # Results canvas with scrollbar; rows are created as they scroll into view
+        self.results_canvas = tk.Canvas(self.results_frame, yscrollincrement=self.RESULT_ROW_HEIGHT // 4)
+        self.results_scrollbar = ttk.Scrollbar(self.results_frame, orient="vertical", command=self.results_canvas.yview)
         
-        self.results_canvas.create_window((0, 0), window=self.results_scrollable_frame, anchor="nw")
-        self.results_canvas.configure(yscrollcommand=results_scrollbar.set)
+        self.results_canvas.configure(yscrollcommand=self._on_results_scrolled)
+        self.results_canvas.bind("<Configure>", self._on_results_resized)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.results_canvas.bind_all(sequence, self._on_results_mousewheel, add="+")
         
         self.results_canvas.pack(side="left", fill="both", expand=True)
-        results_scrollbar.pack(side="right", fill="y")
+        self.results_scrollbar.pack(side="right", fill="y")
+        
+    def _schedule_scrollregion(self, canvas: tk.Canvas):
+        """
+        Recompute a canvas' scrollregion once a burst of <Configure> events has settled.
+        """
+        pending = self._scrollregion_jobs.get(canvas)
+        if pending is not None:
+            self.root.after_cancel(pending)
+        
+        def update():
+            self._scrollregion_jobs.pop(canvas, None)
+            canvas.configure(scrollregion=canvas.bbox("all"))
         
+        self._scrollregion_jobs[canvas] = self.root.after(30, update)
+    
+    def _when_done(self, future: Future, callback, *args):
+        """
+        Call callback(*args, future) on the Tk thread once a worker future has finished.
+        Tk may only be used from the thread running mainloop, so the future is polled
+        from an after() loop instead of using a done-callback on the worker thread.
+        """
+        if future.done():
+            callback(*args, future)
+        else:
+            self.root.after(50, self._when_done, future, callback, *args)
+    
     def setup_manage_tab(self):
         """
         Setup the folder management tab.
@@ -227,7 +285,7 @@ class PhotoSearchGUI:
         try:
             # Load and resize image for display
             image = Image.open(self.selected_image_path)
-            image.thumbnail((300, 300), Image.Resampling.LANCZOS)
+            image.thumbnail((300, 300), Image.Resampling.BILINEAR)
             
             # Convert to PhotoImage
             photo = ImageTk.PhotoImage(image)
@@ -246,13 +304,42 @@ class PhotoSearchGUI:
         if not self.selected_image_path:
             return
         
+        # Clear previous faces
+        for widget in self.face_scrollable_frame.winfo_children():
+            widget.destroy()
+        self.detected_faces = []
+        self.selected_face_encoding = None
+        self._selected_face_query = None
+        self._ref_image_array = None
+        self.search_button.configure(state=tk.DISABLED)
+        ttk.Label(self.face_scrollable_frame, text="Detecting faces...").pack(pady=10)
+        
+        # Get face locations and encodings off the Tk thread
+        image_path = self.selected_image_path
+        future = self._executor.submit(self.face_engine.process_image_for_faces, image_path, True)
+        self._when_done(future, self._on_faces_ready, image_path)
+    
+    def _on_faces_ready(self, image_path: str, future: Future):
+        """
+        Build the face selection widgets once detection has finished.
+        """
+        # A newer image was selected while this one was still being processed
+        if image_path != self.selected_image_path:
+            return
+        
         try:
-            # Clear previous faces
             for widget in self.face_scrollable_frame.winfo_children():
                 widget.destroy()
             
-            # Get face locations and encodings
-            face_locations, face_encodings = self.face_engine.get_face_locations_and_encodings(self.selected_image_path)
+            face_data = future.result()
+            if "error" in face_data:
+                raise RuntimeError(face_data["error"])
+            
+            face_locations = face_data["face_locations"]
+            face_encodings = face_data["face_encodings"]
+            
+            # Keep the decoded image so face thumbnails are cropped without re-reading the file
+            self._ref_image_array = face_data["image"]
             
             if not face_locations:
                 ttk.Label(self.face_scrollable_frame, text="No faces detected").pack(pady=10)
@@ -263,14 +350,14 @@ class PhotoSearchGUI:
             
             # Display each detected face
             for i, (location, encoding) in enumerate(self.detected_faces):
-                self.create_face_selection_widget(i, location, encoding)
+                self.create_face_selection_widget(i, self._ref_image_array, location, encoding)
             
             self.search_button.configure(state=tk.NORMAL)
             
         except Exception as e:
             messagebox.showerror("Error", f"Failed to detect faces: {str(e)}")
     
-    def create_face_selection_widget(self, index: int, location: Tuple, encoding):
+    def create_face_selection_widget(self, index: int, image, location: Tuple, encoding):
         """
         Create a widget for face selection.
         """
@@ -278,12 +365,12 @@ class PhotoSearchGUI:
         face_frame.pack(fill=tk.X, pady=5)
         
         # Extract face image
-        face_image = self.face_engine.extract_face_from_image(self.selected_image_path, location)
+        face_image = self.face_engine.extract_face_from_image(image, location)
         
         if face_image is not None:
             # Convert to PIL Image and resize
             pil_image = Image.fromarray(face_image)
-            pil_image.thumbnail((80, 80), Image.Resampling.LANCZOS)
+            pil_image.thumbnail((80, 80), Image.Resampling.BILINEAR)
             
             # Convert to PhotoImage
             photo = ImageTk.PhotoImage(pil_image)
@@ -308,6 +395,8 @@ class PhotoSearchGUI:
         if 0 <= face_index < len(self.detected_faces):
             _, encoding = self.detected_faces[face_index]
             self.selected_face_encoding = encoding
+            # Quantize once here rather than on every (re-)search of this face
+            self._selected_face_query = DatabaseManager.quantize_query(encoding) if Config.USE_INT8_GALLERY else None
             messagebox.showinfo("Face Selected", f"Face {face_index + 1} selected for search")
     
     def search_similar_faces(self):
@@ -320,12 +409,38 @@ class PhotoSearchGUI:
         
         # Show progress
         self.progress_var.set("Searching for similar faces...")
-        self.root.update()
+        self.search_button.configure(state=tk.DISABLED)
+        
+        # Perform search off the Tk thread
+        tolerance = self.tolerance_var.get()
+        future = self._executor.submit(self._search_with_thumbnails,
+                                       self.selected_face_encoding, tolerance, self._selected_face_query)
+        self._when_done(future, self._on_search_done)
+    
+    def _search_with_thumbnails(self, encoding, tolerance: float, quantized_query=None) -> List[Dict]:
+        """
+        Run a search and prepare every result's thumbnail (worker thread).
+        The Tk thread then only has to load the ready thumbnail files.
+        """
+        results = self.photo_manager.search_similar_faces(encoding, tolerance, quantized_query=quantized_query)
+        
+        # One result per face, so an image can appear several times; generate it once
+        file_paths = list(dict.fromkeys(result['file_path'] for result in results))
+        thumb_paths = dict(zip(file_paths, self._thumb_executor.map(self._thumbnail_path, file_paths)))
+        for result in results:
+            result['thumb_path'] = thumb_paths[result['file_path']]
+        
+        return results
+    
+    def _on_search_done(self, future: Future):
+        """
+        Show the search results once the search has finished.
+        """
+        if self.detected_faces:
+            self.search_button.configure(state=tk.NORMAL)
         
         try:
-            # Perform search
-            tolerance = self.tolerance_var.get()
-            results = self.photo_manager.search_similar_faces(self.selected_face_encoding, tolerance)
+            results = future.result()
             
             self.search_results = results
             self.display_search_results()
@@ -341,38 +456,145 @@ class PhotoSearchGUI:
         Display search results in the results panel.
         """
         # Clear previous results
-        for widget in self.results_scrollable_frame.winfo_children():
+        for widget in self.results_canvas.winfo_children():
             widget.destroy()
+        self.results_canvas.delete("all")
+        self._result_rows = {}
+        self.results_canvas.yview_moveto(0)
         
         if not self.search_results:
-            ttk.Label(self.results_scrollable_frame, text="No similar faces found").pack(pady=20)
+            self.results_canvas.configure(scrollregion=(0, 0, 0, 0))
+            self.results_canvas.create_text(20, 20, text="No similar faces found", anchor="nw")
             return
         
         # Display results
-        for i, result in enumerate(self.search_results):
-            self.create_result_widget(i, result)
+        self.results_canvas.configure(
+            scrollregion=(0, 0, 0, len(self.search_results) * self.RESULT_ROW_HEIGHT)
+        )
+        self._refresh_visible_rows()
     
-    def create_result_widget(self, index: int, result: Dict):
+    def _refresh_visible_rows(self):
         """
-        Create a widget for displaying a search result.
+        Create the result rows that are in (or near) view and destroy the rest.
         """
-        result_frame = ttk.Frame(self.results_scrollable_frame, relief=tk.RIDGE, borderwidth=1)
-        result_frame.pack(fill=tk.X, pady=2, padx=5)
+        if not self.search_results:
+            return
         
-        # Checkbox for selection
-        var = tk.BooleanVar()
-        checkbox = ttk.Checkbutton(result_frame, variable=var)
-        checkbox.pack(side=tk.LEFT, padx=5)
+        top = int(self.results_canvas.canvasy(0))
+        height = self.results_canvas.winfo_height()
+        first = max(0, top // self.RESULT_ROW_HEIGHT - self.RESULT_ROW_OVERSCAN)
+        last = min(len(self.search_results),
+                   (top + height) // self.RESULT_ROW_HEIGHT + 1 + self.RESULT_ROW_OVERSCAN)
+        
+        for index in [i for i in self._result_rows if not first <= i < last]:
+            window_id, row_frame = self._result_rows.pop(index)
+            self.results_canvas.delete(window_id)
+            row_frame.destroy()
+        
+        width = self.results_canvas.winfo_width()
+        for index in range(first, last):
+            if index not in self._result_rows:
+                row_frame = self.create_result_widget(index, self.search_results[index])
+                window_id = self.results_canvas.create_window(
+                    0, index * self.RESULT_ROW_HEIGHT, window=row_frame, anchor="nw",
+                    width=width, height=self.RESULT_ROW_HEIGHT
+                )
+                self._result_rows[index] = (window_id, row_frame)
+    
+    def _on_results_scrolled(self, first, last):
+        """
+        Keep the scrollbar in step with the results view and fill in newly visible rows.
+        """
+        self.results_scrollbar.set(first, last)
+        self._refresh_visible_rows()
+    
+    def _on_results_resized(self, event):
+        """
+        Stretch the result rows to the canvas width and fill in rows for a taller view.
+        """
+        for window_id, _ in self._result_rows.values():
+            self.results_canvas.itemconfigure(window_id, width=event.width)
+        self._refresh_visible_rows()
+    
+    def _on_results_mousewheel(self, event):
+        """
+        Scroll the results with the mouse wheel while the pointer is over them.
+        """
+        if not str(event.widget).startswith(str(self.results_canvas)):
+            return
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.results_canvas.yview_scroll(-1, "units")
+        else:
+            self.results_canvas.yview_scroll(1, "units")
+    
+    def _remove_results(self, file_paths: List[str]):
+        """
+        Drop the results for the given files without searching again.
+        Only their rows are destroyed; rows still on screen just move up.
+        """
+        removed = set(file_paths)
+        if not removed:
+            return
+        
+        kept = []
+        live_rows = {}
+        for old_index, result in enumerate(self.search_results):
+            row = self._result_rows.get(old_index)
+            if result['file_path'] in removed:
+                if row is not None:
+                    self.results_canvas.delete(row[0])
+                    row[1].destroy()
+                continue
+            
+            if row is not None:
+                self.results_canvas.coords(row[0], 0, len(kept) * self.RESULT_ROW_HEIGHT)
+                live_rows[len(kept)] = row
+            kept.append(result)
+        
+        self.search_results = kept
+        self._result_rows = live_rows
+        self.progress_var.set(f"Found {len(kept)} similar faces")
         
-        # Store the variable for later access
-        result['selected_var'] = var
+        if not kept:
+            self.display_search_results()
+            return
+        
+        self.results_canvas.configure(scrollregion=(0, 0, 0, len(kept) * self.RESULT_ROW_HEIGHT))
+        self._refresh_visible_rows()
+    
+    def _sync_result_checkboxes(self):
+        """
+        Update the checkboxes of the rows on screen from the results' selection flags.
+        """
+        for index, (_, row_frame) in self._result_rows.items():
+            row_frame.selected_var.set(self.search_results[index].get('selected', False))
+    
+    def create_result_widget(self, index: int, result: Dict) -> ttk.Frame:
+        """
+        Create the row widget for displaying a search result.
+        The selection lives in result['selected'] so it survives the row being scrolled away.
+        """
+        result_frame = ttk.Frame(self.results_canvas, relief=tk.RIDGE, borderwidth=1)
+        
+        # Checkbox for selection; clicking copies the state into result['selected'].
+        # The variable lives only as long as the row (it is unset when the row is
+        # garbage collected), so variables are bounded by the rows on screen
+        var = tk.BooleanVar(value=result.get('selected', False))
+        checkbox = ttk.Checkbutton(
+            result_frame, variable=var,
+            command=lambda: result.__setitem__('selected', var.get())
+        )
+        checkbox.pack(side=tk.LEFT, padx=5)
+        result_frame.selected_var = var
         
         # Thumbnail
         try:
-            thumbnail_path = self.photo_manager.get_image_thumbnail(result['file_path'])
+            if 'thumb_path' in result:
+                thumbnail_path = result['thumb_path']
+            else:
+                thumbnail_path = self._thumbnail_path(result['file_path'])
             if thumbnail_path and os.path.exists(thumbnail_path):
-                image = Image.open(thumbnail_path)
-                photo = ImageTk.PhotoImage(image)
+                photo = _load_thumb_photoimage(thumbnail_path, os.path.getmtime(thumbnail_path))
                 
                 img_label = ttk.Label(result_frame, image=photo)
                 img_label.image = photo
@@ -387,22 +609,24 @@ class PhotoSearchGUI:
         ttk.Label(info_frame, text=result['file_name'], font=('TkDefaultFont', 9, 'bold')).pack(anchor=tk.W)
         ttk.Label(info_frame, text=f"Similarity: {result['similarity']:.2%}", font=('TkDefaultFont', 8)).pack(anchor=tk.W)
         ttk.Label(info_frame, text=result['file_path'], font=('TkDefaultFont', 8)).pack(anchor=tk.W)
+        
+        return result_frame
     
     def select_all_results(self):
         """
         Select all search results.
         """
         for result in self.search_results:
-            if 'selected_var' in result:
-                result['selected_var'].set(True)
+            result['selected'] = True
+        self._sync_result_checkboxes()
     
     def clear_selection(self):
         """
         Clear all selections.
         """
         for result in self.search_results:
-            if 'selected_var' in result:
-                result['selected_var'].set(False)
+            result['selected'] = False
+        self._sync_result_checkboxes()
     
     def get_selected_files(self) -> List[str]:
         """
@@ -410,7 +634,7 @@ class PhotoSearchGUI:
         """
         selected = []
         for result in self.search_results:
-            if 'selected_var' in result and result['selected_var'].get():
+            if result.get('selected'):
                 selected.append(result['file_path'])
         return selected
     
@@ -451,7 +675,7 @@ class PhotoSearchGUI:
                                       f"Moved {result['successful']} files successfully\n"
                                       f"Failed: {result['failed']}")
                     # Refresh results
-                    self.search_similar_faces()
+                    self._remove_results(result['removed'])
                 except Exception as e:
                     messagebox.showerror("Move Error", f"Failed to move files: {str(e)}")
     
@@ -473,7 +697,7 @@ class PhotoSearchGUI:
                                   f"Deleted {result['successful']} files successfully\n"
                                   f"Failed: {result['failed']}")
                 # Refresh results
-                self.search_similar_faces()
+                self._remove_results(result['removed'])
             except Exception as e:
                 messagebox.showerror("Delete Error", f"Failed to delete files: {str(e)}")
     
@@ -482,10 +706,18 @@ class PhotoSearchGUI:
         Load search folders into the listbox.
         """
         self.folder_listbox.delete(0, tk.END)
-        folders = self.db_manager.get_search_folders()
+        folders = self._get_search_folders()
         for folder in folders:
             self.folder_listbox.insert(tk.END, folder)
     
+    def _get_search_folders(self) -> List[str]:
+        """
+        Get the search folders, reading the database only after they have changed.
+        """
+        if self._folders_cache is None:
+            self._folders_cache = self.db_manager.get_search_folders()
+        return self._folders_cache
+    
     def add_search_folder(self):
         """
         Add a new search folder.
@@ -493,6 +725,7 @@ class PhotoSearchGUI:
         folder = filedialog.askdirectory(title="Select Folder to Add")
         if folder:
             if self.db_manager.add_search_folder(folder):
+                self._folders_cache = None
                 self.load_search_folders()
                 messagebox.showinfo("Success", f"Added folder: {folder}")
             else:
@@ -507,6 +740,7 @@ class PhotoSearchGUI:
             folder = self.folder_listbox.get(selection[0])
             if messagebox.askyesno("Confirm Remove", f"Remove folder from search scope?\n{folder}"):
                 if self.db_manager.remove_search_folder(folder):
+                    self._folders_cache = None
                     self.load_search_folders()
                     messagebox.showinfo("Success", "Folder removed")
                 else:
@@ -516,13 +750,19 @@ class PhotoSearchGUI:
         """
         Index all images in search folders.
         """
-        folders = self.db_manager.get_search_folders()
+        folders = self._get_search_folders()
         if not folders:
             messagebox.showwarning("No Folders", "Please add folders to search scope first")
             return
         
+        if self._indexing:
+            messagebox.showinfo("Indexing", "Indexing is already running")
+            return
+        
         # Run indexing in background thread
+        self._indexing = True
         threading.Thread(target=self._index_folders_background, args=(folders,), daemon=True).start()
+        self.root.after(50, self._drain_progress)
     
     def _index_folders_background(self, folders: List[str]):
         """
@@ -530,43 +770,72 @@ class PhotoSearchGUI:
         """
         try:
             # Scan for images
-            self.progress_var.set("Scanning folders for images...")
+            self._progress_q.put("Scanning folders for images...")
             image_files = self.photo_manager.scan_folders_for_images(folders)
             
             if not image_files:
-                self.progress_var.set("No images found")
+                self._progress_q.put("No images found")
                 return
             
-            # Index images
-            self.progress_var.set(f"Indexing {len(image_files)} images...")
-            self.progress_bar.configure(maximum=len(image_files))
-            
-            # Monitor progress
-            def update_progress():
-                current, total = self.photo_manager.get_indexing_progress()
-                self.progress_bar.configure(value=current)
-                self.progress_var.set(f"Indexing: {current}/{total}")
-                
-                if current < total:
-                    self.root.after(1000, update_progress)
-                else:
-                    self.progress_var.set(f"Indexing complete: {current} images processed")
-            
-            # Start progress monitoring
-            self.root.after(100, update_progress)
+            # Index images, reporting every processed image
+            self._progress_q.put(f"Indexing {len(image_files)} images...")
+            result = self.photo_manager.index_images_batch(
+                image_files,
+                progress_callback=lambda current, total: self._progress_q.put((current, total))
+            )
             
-            # Start indexing
-            result = self.photo_manager.index_images_batch(image_files)
+            self._progress_q.put(f"Indexing complete: {result['progress']} images processed")
             
         except Exception as e:
-            self.progress_var.set(f"Indexing failed: {str(e)}")
+            self._progress_q.put(f"Indexing failed: {str(e)}")
+        finally:
+            self._indexing = False
+    
+    def _drain_progress(self):
+        """
+        Apply the indexing thread's queued updates, then check again in 50 ms while it runs.
+        However many updates were queued, the widgets are set at most once per pass.
+        """
+        progress = None
+        status = None
+        while True:
+            try:
+                update = self._progress_q.get_nowait()
+            except queue.Empty:
+                break
+            
+            if isinstance(update, str):
+                status = update
+            else:
+                # Only the newest count matters; it also replaces any older status text
+                progress = update
+                status = None
+        
+        if progress is not None:
+            current, total = progress
+            self.progress_bar.configure(maximum=total, value=current)
+            if status is None:
+                status = f"Indexing: {current}/{total}"
+        if status is not None:
+            self.progress_var.set(status)
+        
+        if self._indexing or not self._progress_q.empty():
+            self.root.after(50, self._drain_progress)
     
     def refresh_stats(self):
         """
         Refresh database statistics.
+        The queries run on the worker pool; the text is filled in when they finish.
+        """
+        future = self._executor.submit(self.db_manager.get_database_stats)
+        self._when_done(future, self._apply_stats)
+    
+    def _apply_stats(self, future: Future):
+        """
+        Show the database statistics gathered by refresh_stats.
         """
         try:
-            stats = self.db_manager.get_database_stats()
+            stats = future.result()
             
             stats_text = f"""Database Statistics:
             
@@ -593,6 +862,7 @@ Face Detection Rate: {stats['total_faces'] / max(stats['total_images'], 1):.2f}
         if messagebox.askyesno("Confirm Cleanup", "Remove database entries for deleted files?"):
             try:
                 removed = self.photo_manager.cleanup_database()
+                self._thumbnail_path.cache_clear()
                 messagebox.showinfo("Cleanup Complete", f"Removed {removed} orphaned entries")
                 self.refresh_stats()
             except Exception as e:
@@ -606,12 +876,18 @@ Face Detection Rate: {stats['total_faces'] / max(stats['total_images'], 1):.2f}
                               "This will delete ALL face data and search folders!\n"
                               "Are you sure you want to continue?"):
             try:
-                # Remove database file
-                if os.path.exists(self.db_manager.db_path):
-                    os.remove(self.db_manager.db_path)
+                # Remove database file (and its write-ahead log)
+                self.db_manager.close()
+                for path in (self.db_manager.db_path,
+                             self.db_manager.db_path + '-wal',
+                             self.db_manager.db_path + '-shm'):
+                    if os.path.exists(path):
+                        os.remove(path)
                 
                 # Reinitialize
                 self.db_manager.init_database()
+                self._thumbnail_path.cache_clear()
+                self._folders_cache = None
                 self.load_search_folders()
                 self.refresh_stats()
                 
@@ -623,12 +899,18 @@ Face Detection Rate: {stats['total_faces'] / max(stats['total_images'], 1):.2f}
         """
         Start the GUI application.
         """
-        # Initialize stats
-        self.refresh_stats()
+        # Initialize stats once the window is up
+        self.root.after(100, self.refresh_stats)
         
         # Start main loop
-        self.root.mainloop()
+        try:
+            self.root.mainloop()
+        finally:
+            self._executor.shutdown(wait=False)
+            self._thumb_executor.shutdown(wait=False)
 
 if __name__ == "__main__":
+    from config import Config
+    Config.ensure_loaded()
     app = PhotoSearchGUI()
     app.run()
@@ -151,6 +151,8 @@ def main():
         
         # Import GUI after dependency check
         logger.info("Loading application...")
+        from config import Config
+        Config.ensure_loaded()
         from gui_interface import PhotoSearchGUI
         
         # Create and run application
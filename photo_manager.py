@@ -1,12 +1,14 @@
 import os
 import shutil
+import hashlib
+import tempfile
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Callable
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 from face_recognition_engine import FaceRecognitionEngine
 from database_manager import DatabaseManager
+from config import Config
 
 class PhotoManager:
     """
@@ -43,82 +45,175 @@ class PhotoManager:
         
         return image_files
     
-    def index_image(self, image_path: str) -> bool:
+    def _analyze_image(self, image_path: str) -> Tuple[bool, Optional[Dict]]:
         """
-        Index a single image - extract faces and store in database.
+        Detect faces in an image that needs (re)indexing.
+        Returns (success, face_data); face_data is None when there is nothing to store.
         """
-        try:
-            # Check if file exists
-            if not os.path.exists(image_path):
-                return False
-            
-            # Get file metadata
-            file_stat = os.stat(image_path)
-            modification_time = file_stat.st_mtime
-            file_size = file_stat.st_size
-            file_name = os.path.basename(image_path)
-            folder_path = os.path.dirname(image_path)
-            
-            # Check if already processed and up to date
-            if self.db_manager.is_image_processed(image_path, modification_time):
-                return True
-            
-            # Process the image for faces
-            face_data = self.face_engine.process_image_for_faces(image_path)
-            
-            if "error" in face_data:
-                logging.error(f"Error processing {image_path}: {face_data['error']}")
-                return False
-            
+        # Check if file exists
+        if not os.path.exists(image_path):
+            return False, None
+        
+        # Get file metadata
+        file_stat = os.stat(image_path)
+        
+        # Check if already processed and up to date
+        if self.db_manager.is_image_processed(image_path, file_stat.st_mtime):
+            return True, None
+        
+        # Process the image for faces
+        face_data = self.face_engine.process_image_for_faces(image_path)
+        
+        if "error" in face_data:
+            logging.error(f"Error processing {image_path}: {face_data['error']}")
+            return False, None
+        
+        face_data['modification_time'] = file_stat.st_mtime
+        face_data['file_size'] = file_stat.st_size
+        return True, face_data
+    
+    def _store_face_data(self, image_path: str, face_data: Dict) -> bool:
+        """
+        Store an image record and all of its face encodings atomically.
+        Raises if either write fails, so the enclosing transaction is rolled back
+        rather than committing an image without its faces.
+        """
+        with self.db_manager.transaction():
             # Add image record to database
             image_id = self.db_manager.add_image_record(
-                image_path, file_name, file_size, modification_time,
-                face_data['face_count'], folder_path
+                image_path, os.path.basename(image_path), face_data['file_size'],
+                face_data['modification_time'], face_data['face_count'], os.path.dirname(image_path)
             )
             
             if image_id is None:
-                return False
+                raise RuntimeError(f"Failed to add image record for {image_path}")
             
             # Add face encodings
-            for i, (location, encoding) in enumerate(zip(face_data['face_locations'], face_data['face_encodings'])):
-                self.db_manager.add_face_encoding(image_id, i, encoding, location)
+            face_records = list(zip(face_data['face_locations'], face_data['face_encodings']))
+            if not self.db_manager.add_face_encodings_bulk(image_id, face_records):
+                raise RuntimeError(f"Failed to add face encodings for {image_path}")
             
             return True
+    
+    def _store_batch(self, batch: List[Tuple[str, Dict]]) -> int:
+        """
+        Store a batch of analyzed images in a single transaction.
+        Returns the number of images stored.
+        """
+        try:
+            with self.db_manager.transaction():
+                for image_path, face_data in batch:
+                    self._store_face_data(image_path, face_data)
+            return len(batch)
+        except Exception as e:
+            logging.error(f"Error storing batch of {len(batch)} images: {str(e)}")
+        
+        # The whole batch was rolled back; store the images one at a time so a
+        # single bad image does not cost the rest of the batch
+        stored = 0
+        for image_path, face_data in batch:
+            try:
+                self._store_face_data(image_path, face_data)
+                stored += 1
+            except Exception as e:
+                logging.error(f"Error storing {image_path}: {str(e)}")
+        
+        return stored
+    
+    def index_image(self, image_path: str) -> bool:
+        """
+        Index a single image - extract faces and store in database.
+        """
+        try:
+            success, face_data = self._analyze_image(image_path)
+            if face_data is None:
+                return success
+            
+            return self._store_face_data(image_path, face_data)
             
         except Exception as e:
             logging.error(f"Error indexing image {image_path}: {str(e)}")
             return False
     
-    def index_images_batch(self, image_paths: List[str], max_workers: int = 4) -> Dict:
+    def index_images_batch(self, image_paths: List[str], max_workers: int = 4,
+                           progress_callback: Optional[Callable[[int, int], None]] = None,
+                           should_stop: Optional[Callable[[], bool]] = None) -> Dict:
         """
-        Index multiple images using multi-threading.
+        Index multiple images using a pool of worker processes.
+        Results are written to the database in transactions of Config.BATCH_SIZE images.
+        progress_callback(current, total) is called after each image; when should_stop()
+        returns True, images not yet handled are skipped.
         """
         self.indexing_total = len(image_paths)
         self.indexing_progress = 0
         
         successful = 0
         failed = 0
+        indexed = 0
+        pending = []
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks
-            future_to_path = {executor.submit(self.index_image, path): path for path in image_paths}
-            
-            # Process completed tasks
-            for future in as_completed(future_to_path):
-                path = future_to_path[future]
-                try:
-                    result = future.result()
-                    if result:
-                        successful += 1
-                    else:
-                        failed += 1
-                except Exception as e:
-                    logging.error(f"Error processing {path}: {str(e)}")
+        def advance():
+            with self.indexing_lock:
+                self.indexing_progress += 1
+                current = self.indexing_progress
+            if progress_callback:
+                progress_callback(current, self.indexing_total)
+        
+        # Skip missing and already up to date images before starting any workers
+        to_process = []
+        for path in image_paths:
+            try:
+                if self.db_manager.is_image_processed(path, os.stat(path).st_mtime):
+                    successful += 1
+                    advance()
+                    continue
+            except OSError:
+                failed += 1
+                advance()
+                continue
+            to_process.append(path)
+        
+        handled = 0
+        results = self.face_engine.process_images_batch(to_process, max_workers)
+        try:
+            for path, face_data in results:
+                handled += 1
+                if "error" in face_data:
+                    logging.error(f"Error processing {path}: {face_data['error']}")
                     failed += 1
+                else:
+                    face_data['modification_time'] = face_data['timestamp']
+                    pending.append((path, face_data))
+                
+                if len(pending) >= Config.BATCH_SIZE:
+                    stored = self._store_batch(pending)
+                    indexed += stored
+                    successful += stored
+                    failed += len(pending) - stored
+                    pending = []
                 
                 # Update progress
-                with self.indexing_lock:
-                    self.indexing_progress += 1
+                advance()
+                
+                if should_stop and should_stop():
+                    logging.info(f"Indexing stopped after {handled} of {len(to_process)} images")
+                    break
+        
+        except Exception as e:
+            logging.error(f"Error in image processing workers: {str(e)}")
+            failed += len(to_process) - handled
+        finally:
+            results.close()
+        
+        if pending:
+            stored = self._store_batch(pending)
+            indexed += stored
+            successful += stored
+            failed += len(pending) - stored
+        
+        # A large scan can shift the table statistics the query planner relies on
+        if indexed >= Config.BATCH_SIZE:
+            self.db_manager.analyze()
         
         return {
             'total': self.indexing_total,
@@ -135,19 +230,24 @@ class PhotoManager:
         with self.indexing_lock:
             return self.indexing_progress, self.indexing_total
     
-    def search_similar_faces(self, reference_encoding, tolerance: float = 0.6, min_similarity: float = 0.55, restrict_to_current_folder: bool = True) -> List[Dict]:
+    def search_similar_faces(self, reference_encoding, tolerance: float = 0.6, min_similarity: float = 0.55, restrict_to_current_folder: bool = True,
+                             quantized_query: Optional[Tuple] = None) -> List[Dict]:
         """
         Search for images containing similar faces.
         Only returns faces with similarity >= min_similarity (default 55%)
         If restrict_to_current_folder is True, only searches in the currently selected folder
+        quantized_query is an optional DatabaseManager.quantize_query(reference_encoding) result
         """
         try:
-            # Get all face encodings from database
-            all_encodings = self.db_manager.get_all_face_encodings()
+            # Match against all stored faces in one vectorized pass;
+            # results come back sorted by distance (highest similarity first)
+            face_ids, distances = self.db_manager.match_query(reference_encoding, tolerance, quantized_query)
             
-            if not all_encodings:
+            if len(face_ids) == 0:
                 return []
             
+            face_records = self.db_manager.get_face_records(face_ids.tolist())
+            
             # Get currently selected folders for filtering
             current_folders = []
             if restrict_to_current_folder:
@@ -155,36 +255,30 @@ class PhotoManager:
             
             matches = []
             
-            for face_data in all_encodings:
+            for face_id, distance in zip(face_ids.tolist(), distances.tolist()):
+                similarity = 1.0 - distance  # Convert distance to similarity score
+                
+                # Only include faces with similarity >= min_similarity (55% by default)
+                if similarity < min_similarity:
+                    continue
+                
+                face_data = face_records.get(face_id)
+                if face_data is None:
+                    continue
+                
                 # If restricting to current folder, check if the image is in one of the current folders
                 if restrict_to_current_folder and current_folders:
-                    image_in_current_folder = False
-                    for folder in current_folders:
-                        if face_data['file_path'].startswith(folder):
-                            image_in_current_folder = True
-                            break
-                    
-                    # Skip this image if it's not in the current folder(s)
-                    if not image_in_current_folder:
+                    if not any(face_data['file_path'].startswith(folder) for folder in current_folders):
                         continue
                 
-                # Compare with reference encoding
-                distance = self.face_engine.face_distance([face_data['encoding']], reference_encoding)[0]
-                similarity = 1.0 - distance  # Convert distance to similarity score
-                
-                # Only include faces with similarity >= min_similarity (55% by default)
-                if distance <= tolerance and similarity >= min_similarity:
-                    matches.append({
-                        'file_path': face_data['file_path'],
-                        'file_name': face_data['file_name'],
-                        'face_location': face_data['face_location'],
-                        'distance': distance,
-                        'similarity': similarity,
-                        'face_index': face_data['face_index']
-                    })
-            
-            # Sort by similarity (highest first)
-            matches.sort(key=lambda x: x['similarity'], reverse=True)
+                matches.append({
+                    'file_path': face_data['file_path'],
+                    'file_name': face_data['file_name'],
+                    'face_location': face_data['face_location'],
+                    'distance': distance,
+                    'similarity': similarity,
+                    'face_index': face_data['face_index']
+                })
             
             return matches
             
@@ -236,6 +330,7 @@ class PhotoManager:
     def move_files(self, source_paths: List[str], destination_folder: str) -> Dict:
         """
         Move files to destination folder.
+        'removed' in the result lists the source paths whose images left the database.
         """
         if not os.path.exists(destination_folder):
             os.makedirs(destination_folder)
@@ -243,6 +338,7 @@ class PhotoManager:
         successful = 0
         failed = 0
         errors = []
+        removed = []
         
         for source_path in source_paths:
             try:
@@ -262,6 +358,7 @@ class PhotoManager:
                     
                     # Update database with new path
                     self.db_manager.delete_image_and_faces(source_path)
+                    removed.append(source_path)
                     successful += 1
                 else:
                     failed += 1
@@ -274,26 +371,31 @@ class PhotoManager:
         return {
             'successful': successful,
             'failed': failed,
-            'errors': errors
+            'errors': errors,
+            'removed': removed
         }
     
     def delete_files(self, file_paths: List[str]) -> Dict:
         """
         Delete files and remove from database.
+        'removed' in the result lists the paths whose images left the database.
         """
         successful = 0
         failed = 0
         errors = []
+        removed = []
         
         for file_path in file_paths:
             try:
                 if os.path.exists(file_path):
                     os.remove(file_path)
                     self.db_manager.delete_image_and_faces(file_path)
+                    removed.append(file_path)
                     successful += 1
                 else:
                     # Still try to remove from database
-                    self.db_manager.delete_image_and_faces(file_path)
+                    if self.db_manager.delete_image_and_faces(file_path):
+                        removed.append(file_path)
                     failed += 1
                     errors.append(f"File not found: {file_path}")
                     
@@ -304,12 +406,15 @@ class PhotoManager:
         return {
             'successful': successful,
             'failed': failed,
-            'errors': errors
+            'errors': errors,
+            'removed': removed
         }
     
     def get_image_thumbnail(self, image_path: str, size: Tuple[int, int] = (150, 150)) -> Optional[str]:
         """
         Generate thumbnail for an image.
+        Safe to call from several threads: thumbnails are named per source path and
+        written to a temporary file first, so a reader never sees a partial file.
         Returns path to thumbnail or None if failed.
         """
         try:
@@ -317,13 +422,14 @@ class PhotoManager:
             
             # Create thumbnails directory
             thumb_dir = os.path.join(os.path.dirname(__file__), "thumbnails")
-            if not os.path.exists(thumb_dir):
-                os.makedirs(thumb_dir)
+            os.makedirs(thumb_dir, exist_ok=True)
             
-            # Generate thumbnail filename
+            # Generate thumbnail filename; the path hash keeps same-named files
+            # from different folders apart
             file_name = os.path.basename(image_path)
             name, ext = os.path.splitext(file_name)
-            thumb_name = f"{name}_thumb{ext}"
+            path_hash = hashlib.sha1(os.path.abspath(image_path).encode('utf-8')).hexdigest()[:12]
+            thumb_name = f"{name}_{path_hash}_thumb{ext}"
             thumb_path = os.path.join(thumb_dir, thumb_name)
             
             # Check if thumbnail already exists and is newer than original
@@ -336,7 +442,15 @@ class PhotoManager:
             # Create thumbnail
             with Image.open(image_path) as img:
                 img.thumbnail(size, Image.Resampling.LANCZOS)
-                img.save(thumb_path)
+                
+                fd, temp_path = tempfile.mkstemp(suffix=ext, dir=thumb_dir)
+                try:
+                    with os.fdopen(fd, 'wb') as fh:
+                        img.save(fh, format=Image.registered_extensions().get(ext.lower()))
+                    os.replace(temp_path, thumb_path)
+                except BaseException:
+                    os.remove(temp_path)
+                    raise
                 return thumb_path
                 
         except Exception as e:
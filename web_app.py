@@ -20,6 +20,8 @@ from config import Config
 import threading
 import time
 
+Config.ensure_loaded()
+
 # Conditionally import Google Drive modules
 if Config.ENABLE_GOOGLE_DRIVE:
     try:
@@ -72,7 +74,8 @@ def upload_reference():
             
             # Process the image for faces
             logger.info(f"Processing image for faces: {filepath}")
-            face_data = face_engine.process_image_for_faces(filepath)
+            face_data = face_engine.process_image_for_faces(filepath, return_image=True)
+            image = face_data.pop('image', None)
             logger.info(f"Face detection result: {face_data}")
             
             if 'error' in face_data:
@@ -88,7 +91,7 @@ def upload_reference():
             faces = []
             for i, (location, encoding) in enumerate(zip(face_data['face_locations'], face_data['face_encodings'])):
                 # Extract face thumbnail
-                face_image = face_engine.extract_face_from_image(filepath, location)
+                face_image = face_engine.extract_face_from_image(image, location)
                 if face_image is not None:
                     # Convert to base64 for web display
                     pil_image = Image.fromarray(face_image)
@@ -150,7 +153,8 @@ def upload_camera_capture():
         
         # Process the image for faces
         logger.info(f"Processing camera capture for faces: {filepath}")
-        face_data = face_engine.process_image_for_faces(filepath)
+        face_data = face_engine.process_image_for_faces(filepath, return_image=True)
+        image = face_data.pop('image', None)
         logger.info(f"Face detection result: {face_data}")
         
         if 'error' in face_data:
@@ -166,7 +170,7 @@ def upload_camera_capture():
         faces = []
         for i, (location, encoding) in enumerate(zip(face_data['face_locations'], face_data['face_encodings'])):
             # Extract face thumbnail
-            face_image = face_engine.extract_face_from_image(filepath, location)
+            face_image = face_engine.extract_face_from_image(image, location)
             if face_image is not None:
                 # Convert to base64 for web display
                 pil_image = Image.fromarray(face_image)
@@ -288,8 +292,7 @@ def search_faces():
                             
                             if 'face_encodings' in face_data and len(face_data['face_encodings']) > 0:
                                 # Compare with the input face encoding
-                                import face_recognition
-                                distances = face_recognition.face_distance(face_data['face_encodings'], face_encoding)
+                                distances = face_engine.face_distance(face_encoding, face_data['face_encodings'])
                                 
                                 # Find the best match
                                 if len(distances) > 0: